@@ -5,6 +5,11 @@ import json
 import yaml
 import random
 import re
+import os
+import time
+import collections
+from image_pyramid import TilePyramid
+from batch_source import AsyncSaver, BatchSource, PrefetchCache
 
 class Selection:
     def __init__(self):
@@ -31,12 +36,25 @@ class Selection:
 # New button for loading JSON
         self.classes_loaded_label = self.tk.Label(button_frame, text="No classes file loaded", fg="red")
         self.classes_loaded_label.grid(row=1, columnspan=8)
+        self.frame_time_label = self.tk.Label(button_frame, text="", fg="gray")
+        self.frame_time_label.grid(row=1, column=8)
+
+        # Batch labeling over a folder or sampled video frames
+        self.tk.Button(button_frame, text="Open Folder", command=self.open_folder).grid(row=0, column=9)
+        self.tk.Button(button_frame, text="Open Video", command=self.open_video).grid(row=0, column=10)
+        self.tk.Button(button_frame, text="< Prev", command=self.prev_image).grid(row=0, column=11)
+        self.tk.Button(button_frame, text="Next >", command=self.next_image).grid(row=0, column=12)
+        self.batch_label = self.tk.Label(button_frame, text="", fg="gray")
+        self.batch_label.grid(row=1, column=9, columnspan=4)
 
         # Initialize properties
         self.image_path = None
         self.image = None
+        self.pyramid = None
         self.canvas_image = None
-        self.save_bounding_boxes = []
+        self.image_item = None
+        self.region_items = []  # (outline, label) canvas items per box, parallel to canvas_bounding_boxes
+        self.overlay_view = (0, 0, 1.0)  # (zoom_x, zoom_y, zoom_factor) the overlay items are currently drawn for
         self.canvas_bounding_boxes = []
         self.current_box = []
         self.canvas_box = []
@@ -45,8 +63,13 @@ class Selection:
         self.draw_mode = False  # Initialize draw mode to False
         self.class_load = False  # Flag to track if YAML file is loaded
         self.class_colors = {}  # Dictionary to store class colors
-        self.isjsonload = False
         self.classes = []  # Initialize classes list
+        self.batch = None  # BatchSource while labeling a folder or video
+        self.batch_index = None
+        self.prefetch = None
+        self.save_errors = collections.deque()  # filled by the saver thread, shown from the Tk thread
+        self.saver = AsyncSaver(on_error=lambda path, e: self.save_errors.append((path, e)))
+        self.save_error_poll_ms = 250
 
 
         # Setup class combo box
@@ -61,9 +84,19 @@ class Selection:
         self.canvas_width = 1280
         self.canvas_height = 720
         self.zoom_factor = 1.0
+        self.max_zoom = 5.0
         self.zoom_x = 0
         self.zoom_y = 0
 
+        # Interactive redraw: events are coalesced into one fast redraw per idle cycle,
+        # the LANCZOS redraw follows once the view has been still for settle_ms
+        self.interactive_resample = Image.BILINEAR
+        self.settle_ms = 150
+        self.target_fps = 30
+        self.redraw_job = None
+        self.settle_job = None
+        self.frame_times = collections.deque(maxlen=30)  # seconds per interactive redraw
+
         # Variables for dragging
         self.drag_start_x = 0
         self.drag_start_y = 0
@@ -81,6 +114,10 @@ class Selection:
         self.canvas.bind("<ButtonRelease-1>", self.end_drag)
         self.master.bind("<Control-z>", self.undo_last_box)
         self.master.bind("b", self.toggle_draw_mode_key)
+        self.master.bind("n", self.next_image)
+        self.master.bind("p", self.prev_image)
+        self.master.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.master.after(0, self.show_save_errors)
 
         self.master.mainloop()
 
@@ -100,11 +137,15 @@ class Selection:
         if not self.image_path:
             return
 
-        self.image = Image.open(self.image_path)
-        self.img_width, self.img_height = self.image.size
+        self.close_batch()
+        self.set_image(TilePyramid(Image.open(self.image_path)))
 
-        # Resize image to fit canvas
-        self.image = self.image.resize((self.canvas_width, self.canvas_height), Image.LANCZOS)
+    def set_image(self, pyramid):
+        # Keep the full-resolution image, the view is composed from pyramid tiles on every refresh
+        self.pyramid = pyramid
+        self.image = pyramid.image
+        self.img_width, self.img_height = self.image.size
+        self.max_zoom = max(5.0, 2 * self.img_width / self.canvas_width, 2 * self.img_height / self.canvas_height)
         self.reset_view()
 
     def load_json(self):
@@ -114,71 +155,126 @@ class Selection:
             try:
                 with open(file_path, 'r') as f:
                     bounding_boxes_data = json.load(f)
-                
-                self.save_bounding_boxes = []
-                self.canvas_bounding_boxes = []
-                for box_data in bounding_boxes_data:
-                    points = box_data["points"]
-                    class_name = box_data["class"]
-                    
-                    # Convert points back to canvas coordinates
-                    savebox_points = []
-                    canvas_points = []
-                    for x, y in points:
-                        canvas_x = x / (self.img_width / self.canvas_width)
-                        canvas_y = y / (self.img_height / self.canvas_height)
-                        savebox_points.append((x, y))
-                        canvas_points.append((canvas_x, canvas_y))
-                    self.class_colors[class_name] = self.get_random_color() ## class color를 미리 설정
-                    self.save_bounding_boxes.append((savebox_points, class_name))
-                    self.canvas_bounding_boxes.append((canvas_points, class_name))
-
-                self.isjsonload = True
+                self.apply_boxes(bounding_boxes_data)
                 self.refresh_image()
-                self.isjsonload = False
                 messagebox.showinfo("Success", "Bounding boxes loaded from JSON file")
             except Exception as e:
-                self.isjsonload = False
                 messagebox.showerror("Error", f"Failed to load JSON: {e}")
 
+    def apply_boxes(self, bounding_boxes_data):
+        """Replaces the current boxes with ones in full-resolution pixels, as stored in the JSON files."""
+        self.canvas_bounding_boxes = []
+        self.canvas.delete("region")
+        self.region_items = []
+        for box_data in bounding_boxes_data:
+            points = box_data["points"]
+            class_name = box_data["class"]
+            
+            # Convert points back to canvas coordinates
+            canvas_points = []
+            for x, y in points:
+                # Boxes are kept normalized to the image size
+                canvas_x = x / self.img_width
+                canvas_y = y / self.img_height
+                canvas_points.append((canvas_x, canvas_y))
+            if class_name not in self.class_colors:
+                self.class_colors[class_name] = self.get_random_color() ## class color를 미리 설정
+            self.canvas_bounding_boxes.append((canvas_points, class_name))
+            self.region_items.append(self.draw_bounding_box(canvas_points, class_name))
+
     def reset_view(self):
         self.zoom_factor = 1.0
         self.zoom_x = 0
         self.zoom_y = 0
         self.refresh_image()
 
-    def refresh_image(self):
+    def refresh_image(self, resample=Image.LANCZOS):
         if self.image:
+            start = time.perf_counter()
             # Calculate the region to display
-            zoom_width = int(self.canvas_width / self.zoom_factor)
-            zoom_height = int(self.canvas_height / self.zoom_factor)
-            x1 = self.zoom_x
-            y1 = self.zoom_y
-            x2 = x1 + zoom_width
-            y2 = y1 + zoom_height
+            zoom_width = self.canvas_width / self.zoom_factor
+            zoom_height = self.canvas_height / self.zoom_factor
 
             # Ensure the view stays within the image bounds
-            x1 = max(0, min(x1, self.canvas_width - zoom_width))
-            y1 = max(0, min(y1, self.canvas_height - zoom_height))
+            x1 = max(0, min(self.zoom_x, self.canvas_width - zoom_width))
+            y1 = max(0, min(self.zoom_y, self.canvas_height - zoom_height))
             x2 = min(self.canvas_width, x1 + zoom_width)
             y2 = min(self.canvas_height, y1 + zoom_height)
 
             self.zoom_x, self.zoom_y = x1, y1
 
-            # Crop and resize the image
-            zoomed_image = self.image.crop((x1, y1, x2, y2))
-            zoomed_image = zoomed_image.resize((self.canvas_width, self.canvas_height), Image.LANCZOS)
-
-            self.canvas_image = ImageTk.PhotoImage(zoomed_image)
-            self.canvas.config(width=self.canvas_width, height=self.canvas_height)
-            self.canvas.delete("all")
-            self.canvas.create_image(0, 0, anchor=self.tk.NW, image=self.canvas_image)
+            # Compose the visible part of the full-resolution image from the pyramid tiles
+            sx = self.img_width / self.canvas_width
+            sy = self.img_height / self.canvas_height
+            zoomed_image = self.pyramid.render(
+                (x1 * sx, y1 * sy, x2 * sx, y2 * sy), (self.canvas_width, self.canvas_height), resample
+            )
 
-            # Redraw bounding boxes
-            for box, class_name in self.canvas_bounding_boxes:
-                self.draw_bounding_box(box, class_name)
+            # The image item and its PhotoImage are created once, later refreshes only paste new pixels
+            if self.image_item is None:
+                self.canvas_image = ImageTk.PhotoImage(zoomed_image)
+                self.image_item = self.canvas.create_image(0, 0, anchor=self.tk.NW, image=self.canvas_image, tags="image")
+                self.canvas.tag_lower(self.image_item)
+                self.canvas.config(width=self.canvas_width, height=self.canvas_height)
+                self.canvas.pack(side=self.tk.BOTTOM)
+            else:
+                self.canvas_image.paste(zoomed_image)
+
+            self.update_overlay()
+            self.show_frame_time(time.perf_counter() - start, resample != Image.LANCZOS)
+
+    def schedule_refresh(self):
+        """
+        Requests a redraw from an interaction event.
+
+        Any number of events before the next idle cycle share one fast redraw, and every
+        event pushes the high quality redraw back until the view has settled.
+        """
+        if self.redraw_job is None:
+            self.redraw_job = self.master.after_idle(self.interactive_refresh)
+        if self.settle_job is not None:
+            self.master.after_cancel(self.settle_job)
+        self.settle_job = self.master.after(self.settle_ms, self.settled_refresh)
+
+    def interactive_refresh(self):
+        self.redraw_job = None
+        self.refresh_image(self.interactive_resample)
+
+    def settled_refresh(self):
+        self.settle_job = None
+        self.refresh_image()
 
-            self.canvas.pack(side=self.tk.BOTTOM)
+    def show_frame_time(self, seconds, interactive):
+        """Shows the last redraw time, interactive redraws slower than target_fps are shown in red."""
+        if interactive:
+            self.frame_times.append(seconds)
+            mean = sum(self.frame_times) / len(self.frame_times)
+            color = "green" if mean <= 1.0 / self.target_fps else "red"
+            self.frame_time_label.config(text=f"frame {seconds * 1e3:.1f} ms (avg {mean * 1e3:.1f} ms, {1.0 / mean:.0f} fps)", fg=color)
+        else:
+            self.frame_time_label.config(text=f"full quality {seconds * 1e3:.1f} ms", fg="gray")
+
+    def to_canvas(self, x, y):
+        """Normalized image coordinates to canvas pixels in the view the overlay items are drawn for."""
+        zoom_x, zoom_y, zoom_factor = self.overlay_view
+        return (x * self.canvas_width - zoom_x) * zoom_factor, (y * self.canvas_height - zoom_y) * zoom_factor
+
+    def update_overlay(self):
+        """
+        Moves every overlay item (boxes, labels, pending points) to the current view.
+
+        Items keep their canvas coordinates between refreshes, so a pan or zoom is one tag-wide
+        scale and move instead of deleting and recreating them.
+        """
+        zoom_x0, zoom_y0, zoom_factor0 = self.overlay_view
+        if (zoom_x0, zoom_y0, zoom_factor0) == (self.zoom_x, self.zoom_y, self.zoom_factor):
+            return
+        # canvas = (image - zoom) * factor, so new = old * (f1 / f0) + (zoom0 - zoom1) * f1
+        ratio = self.zoom_factor / zoom_factor0
+        if ratio != 1.0:
+            self.canvas.scale("overlay", 0, 0, ratio, ratio)
+        self.canvas.move("overlay", (zoom_x0 - self.zoom_x) * self.zoom_factor, (zoom_y0 - self.zoom_y) * self.zoom_factor)
+        self.overlay_view = (self.zoom_x, self.zoom_y, self.zoom_factor)
 
     def on_mouse_wheel(self, event):
         if self.image:
@@ -194,13 +290,13 @@ class Selection:
             if event.num == 5 or event.delta == -120:  # Scroll down
                 self.zoom_factor = max(1.0, self.zoom_factor - 0.1)
             if event.num == 4 or event.delta == 120:  # Scroll up
-                self.zoom_factor = min(5.0, self.zoom_factor + 0.1)
+                self.zoom_factor = min(self.max_zoom, self.zoom_factor + 0.1)
 
             # Recalculate zoom region
             self.zoom_x = max(0, min(zoom_center_x - self.canvas_width / (2 * self.zoom_factor), self.canvas_width - self.canvas_width / self.zoom_factor))
             self.zoom_y = max(0, min(zoom_center_y - self.canvas_height / (2 * self.zoom_factor), self.canvas_height - self.canvas_height / self.zoom_factor))
 
-            self.refresh_image()
+            self.schedule_refresh()
 
     def undo_last_box(self, event=None):
         self.remove_last_bounding_box()
@@ -221,7 +317,7 @@ class Selection:
             self.zoom_y = max(0, min(self.zoom_y - dy, self.canvas_height - self.canvas_height / self.zoom_factor))
             self.drag_start_x = event.x
             self.drag_start_y = event.y
-            self.refresh_image()
+            self.schedule_refresh()
 
     def end_drag(self, event):
         if self.dragging:
@@ -240,9 +336,9 @@ class Selection:
         self.current_box.append((event.x, event.y))
         self.canvas_box.append((x,y))
         # Draw point on canvas
-        canvas_x = int((x * self.canvas_width - self.zoom_x) * self.zoom_factor)
-        canvas_y = int((y * self.canvas_height - self.zoom_y) * self.zoom_factor)
-        self.canvas.create_oval(canvas_x-3, canvas_y-3, canvas_x+3, canvas_y+3, fill="red")
+        self.update_overlay()
+        canvas_x, canvas_y = self.to_canvas(x, y)
+        self.canvas.create_oval(canvas_x-3, canvas_y-3, canvas_x+3, canvas_y+3, fill="red", tags=("overlay", "pending"))
 
         if len(self.current_box) == 4:
             self.draw_mode = False  # Deactivate draw mode after completing the box
@@ -267,18 +363,14 @@ class Selection:
             
             if self.rectangular_mode.get():
                 # Convert to rectangular bounding box
-                x_coords, y_coords = zip(*self.current_box)
-                x_min, x_max = min(x_coords), max(x_coords)
-                y_min, y_max = min(y_coords), max(y_coords)
-                self.current_box = [(x_min, y_min), (x_max, y_min), (x_max, y_max), (x_min, y_max)]
                 x_coords, y_coords = zip(*self.canvas_box)
                 x_min, x_max = min(x_coords), max(x_coords)
                 y_min, y_max = min(y_coords), max(y_coords)
                 self.canvas_box = [(x_min, y_min), (x_max, y_min), (x_max, y_max), (x_min, y_max)]
             
-            self.save_bounding_boxes.append((self.current_box, self.class_name))
             self.canvas_bounding_boxes.append((self.canvas_box, self.class_name))
-            self.draw_bounding_box(self.canvas_box, self.class_name)
+            self.region_items.append(self.draw_bounding_box(self.canvas_box, self.class_name))
+            self.canvas.delete("pending")
             self.current_box = []
             self.canvas_box = []
             if self.class_load:
@@ -286,6 +378,7 @@ class Selection:
         else:
             self.current_box = []  # Reset the current box if no class name was provided
             self.canvas_box = []
+            self.canvas.delete("pending")
 
 
     def show_class_selection_window(self):        
@@ -324,58 +417,154 @@ class Selection:
             messagebox.showerror("Error", f"Failed to load classes: {e}")
 
     def draw_bounding_box(self, box, class_name):
-        color = self.class_colors[class_name]
-        for i in range(4):
-            x1, y1 = box[i]
-            x2, y2 = box[(i + 1) % 4]
-
-            if self.isjsonload:
-                canvas_x1 = int(x1)
-                canvas_y1 = int(y1)
-                canvas_x2 = int(x2)
-                canvas_y2 = int(y2)
-            else:
-                canvas_x1 = int((x1 * self.canvas_width - self.zoom_x) * self.zoom_factor)
-                canvas_y1 = int((y1 * self.canvas_height - self.zoom_y) * self.zoom_factor)
-                canvas_x2 = int((x2 * self.canvas_width - self.zoom_x) * self.zoom_factor)
-                canvas_y2 = int((y2 * self.canvas_height - self.zoom_y) * self.zoom_factor)
+        """
+        Creates the retained canvas items of one box in the current overlay view.
 
-            self.canvas.create_line(canvas_x1, canvas_y1, canvas_x2, canvas_y2, fill=color, width=2)
-
-        # Draw class name
-        x, y = box[0]
-        canvas_x = int((x * self.canvas_width - self.zoom_x) * self.zoom_factor)
-        canvas_y = int((y * self.canvas_height - self.zoom_y) * self.zoom_factor)
-        self.canvas.create_text(canvas_x, canvas_y-10, text=class_name, fill=color)
+        Returns:
+            items (tuple): (outline, label) canvas item ids
+        """
+        self.update_overlay()
+        color = self.class_colors[class_name]
+        coords = [c for x, y in box for c in self.to_canvas(x, y)]
+        outline = self.canvas.create_polygon(*coords, outline=color, fill="", width=2, tags=("overlay", "region"))
+        # Anchored above the first corner so the label stays in place when the view is scaled
+        label = self.canvas.create_text(coords[0], coords[1] - 3, text=class_name, fill=color, anchor=self.tk.S, tags=("overlay", "region"))
+        return outline, label
 
     def remove_last_bounding_box(self):
-        if self.save_bounding_boxes:
-            self.save_bounding_boxes.pop()
+        if self.canvas_bounding_boxes:
             self.canvas_bounding_boxes.pop()
-            self.refresh_image()
+            for item in self.region_items.pop():
+                self.canvas.delete(item)
         else:
             messagebox.showwarning("Warning", "No bounding boxes to remove.")
 
-    def save_to_json(self):
-        canvas_width, canvas_height = self.canvas.winfo_width(), self.canvas.winfo_height()
-        width_scaling_factor = self.img_width / canvas_width
-        height_scaling_factor = self.img_height / canvas_height
+    def boxes_data(self):
+        # Boxes are normalized to the image, so they map straight to full-resolution pixels
         bounding_boxes_data = []
-        for box, class_name in self.save_bounding_boxes:
+        for box, class_name in self.canvas_bounding_boxes:
             rescaled_box = []
             for x, y in box:
-                rescaled_x = int(x * width_scaling_factor)
-                rescaled_y = int(y * height_scaling_factor)
+                rescaled_x = int(x * self.img_width)
+                rescaled_y = int(y * self.img_height)
                 rescaled_box.append((rescaled_x, rescaled_y))
             bounding_boxes_data.append(
                 {"points": rescaled_box, "class": class_name}
             )
+        return bounding_boxes_data
+
+    def json_path(self):
+        if self.batch is not None:
+            return self.batch.json_paths[self.batch_index]
         save_filename = re.sub(r'\.(jpg|jpeg|png)$', '', self.image_path, flags=re.IGNORECASE)
-        with open(f"{save_filename}_bounding_boxes.json", "w") as f:
-            json.dump(bounding_boxes_data, f, indent=4)
+        return f"{save_filename}_bounding_boxes.json"
+
+    def save_to_json(self):
+        with open(self.json_path(), "w") as f:
+            json.dump(self.boxes_data(), f, indent=4)
 
         messagebox.showinfo("Success", "Bounding boxes saved to bounding_boxes.json")
 
+    def open_folder(self):
+        folder = filedialog.askdirectory()
+        if folder:
+            self.start_batch(BatchSource.from_folder(folder))
+
+    def open_video(self):
+        video_path = filedialog.askopenfilename(filetypes=[("Video Files", "*.mp4;*.avi;*.mov;*.mkv")])
+        if not video_path:
+            return
+        every = simpledialog.askinteger("Open Video", "Label every n-th frame:", initialvalue=30, minvalue=1)
+        if not every:
+            return
+        try:
+            source = BatchSource.from_video(video_path, every)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to open video: {e}")
+            return
+        self.start_batch(source)
+
+    def start_batch(self, source):
+        if not len(source):
+            messagebox.showwarning("Warning", "No images found.")
+            return
+        self.close_batch()
+        self.batch = source
+        self.prefetch = PrefetchCache(source, (self.canvas_width, self.canvas_height))
+        self.show_batch_image(0)
+
+    def close_batch(self):
+        if self.batch is None:
+            return
+        self.autosave()
+        self.prefetch.close()
+        self.batch = self.prefetch = self.batch_index = None
+        self.batch_label.config(text="")
+
+    def autosave(self):
+        """Queues the boxes of the current batch image for saving, the UI does not wait for the write."""
+        if self.batch_index is None:
+            return
+        json_path = self.json_path()
+        if self.canvas_bounding_boxes or os.path.exists(json_path):
+            self.saver.save(json_path, self.boxes_data())
+
+    def show_save_errors(self, reschedule=True):
+        """
+        Shows the autosave failures reported by the saver thread.
+
+        Tk may only be used from its own thread, so the saver only queues the errors and this
+        method polls them on the Tk thread.
+        """
+        while self.save_errors:
+            path, e = self.save_errors.popleft()
+            messagebox.showerror("Error", f"Autosave of {path} failed: {e}")
+        if reschedule:
+            self.master.after(self.save_error_poll_ms, self.show_save_errors)
+
+    def next_image(self, event=None):
+        if self.batch is not None and self.batch_index + 1 < len(self.batch):
+            self.show_batch_image(self.batch_index + 1)
+
+    def prev_image(self, event=None):
+        if self.batch is not None and self.batch_index > 0:
+            self.show_batch_image(self.batch_index - 1)
+
+    def show_batch_image(self, index):
+        """
+        Shows one image of the batch, normally already decoded by the prefetch thread.
+
+        The image gets the boxes of its own JSON file when it has one, otherwise the
+        boxes of the previous image are carried over.
+        """
+        self.autosave()
+        try:
+            pyramid = self.prefetch.get(index)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to load {self.batch.names[index]}: {e}")
+            return
+        self.batch_index = index
+        self.current_box = []
+        self.canvas_box = []
+        self.canvas.delete("pending")
+        self.set_image(pyramid)
+
+        json_path = self.json_path()
+        if os.path.exists(json_path):
+            try:
+                with open(json_path, 'r') as f:
+                    self.apply_boxes(json.load(f))
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to load JSON: {e}")
+        self.batch_label.config(text=f"{index + 1}/{len(self.batch)} {self.batch.names[index]}")
+
+    def on_close(self):
+        self.close_batch()
+        self.saver.close()
+        # The last saves are written by close, their failures are shown before the window goes away
+        self.show_save_errors(reschedule=False)
+        self.master.destroy()
+
     def toggle_draw_mode(self):
         self.draw_mode = not self.draw_mode
         if self.draw_mode:
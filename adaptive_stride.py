@@ -0,0 +1,102 @@
+import cv2
+import numpy as np
+
+
+class AdaptiveStride:
+    """Runs detection only every K frames while the regions are still, K grows while the region states stay stable."""
+
+    def __init__(self, management, max_stride=8, scale=0.25, diff_threshold=15, motion_area=400, margin=16):
+        """
+        Initializes the scheduler of one stream.
+
+        Every frame is downscaled to grayscale and compared with the last detected frame inside the
+        region masks. More than motion_area pixels changing by more than diff_threshold count as
+        motion and detect at once with K back at 1. Without motion a frame is detected when K frames
+        passed since the last detection. The region states of every detected frame are handed back
+        with observe once it is processed, K doubles up to max_stride while they stay the same and
+        drops to 1 when they change. Skipped frames reuse the last tracked boxes.
+
+        check and observe may run on different threads, e.g. the infer and post-processing stages
+        of PipelinedRunner, K then only grows on states that were actually processed.
+
+        Args:
+            management (Managing_Parts): regions whose masks are watched and whose states drive K
+            max_stride (int): largest K
+            scale (float): downscale factor of the motion check
+            diff_threshold (int): gray level difference of a changed pixel
+            motion_area (int): changed area in full-resolution pixels that counts as motion, about a 20x20 patch
+            margin (int): pixels the masks are grown by, so objects are seen before they reach a region
+        """
+        self.management = management
+        self.max_stride = max_stride
+        self.scale = scale
+        self.diff_threshold = diff_threshold
+        self.motion_pixels = motion_area * scale * scale
+        self.margin = margin
+        self.stride = 1
+        self.since = 0  # frames since the last detection
+        self.reference = None  # downscaled gray of the last detected frame
+        self.states = None  # region states of the last observed detection
+        self.regions = None
+        self.mask = None
+        self.frames = 0
+        self.detections = 0
+
+    def _small(self, frame):
+        h, w = frame.shape[:2]
+        size = (max(int(w * self.scale), 1), max(int(h * self.scale), 1))
+        return cv2.cvtColor(cv2.resize(frame, size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+
+    def _update_mask(self, frame_shape):
+        self.regions = self.management.regions
+        h, w = frame_shape[:2]
+        layout = getattr(self.management, "layout", None)
+        if layout is not None and layout.label_map is not None and layout.label_map.shape == (h, w):
+            mask = (layout.label_map > 0).astype(np.uint8)
+        else:
+            mask = np.zeros((h, w), dtype=np.uint8)
+            cv2.fillPoly(mask, self.regions.polygons, 1)
+        if self.margin:
+            mask = cv2.dilate(mask, np.ones((2 * self.margin + 1, 2 * self.margin + 1), dtype=np.uint8))
+        small = cv2.resize(mask, (self.reference.shape[1], self.reference.shape[0]), interpolation=cv2.INTER_AREA)
+        self.mask = small > 0
+
+    def check(self, frame):
+        """
+        Decides whether a frame needs detection, call it for every frame in stream order.
+
+        Args:
+            frame (ndarray): decoded frame
+
+        Returns:
+            detect (bool): run the detector on this frame, otherwise reuse the last tracked boxes
+        """
+        self.frames += 1
+        small = self._small(frame)
+        if self.reference is not None:
+            if self.mask is None or self.management.regions is not self.regions:
+                self._update_mask(frame.shape)
+            changed = cv2.absdiff(small, self.reference)[self.mask] > self.diff_threshold
+            self.since += 1
+            if np.count_nonzero(changed) > self.motion_pixels:
+                self.stride = 1
+            elif self.since < self.stride:
+                return False
+        self.reference = small
+        self.since = 0
+        self.detections += 1
+        return True
+
+    def observe(self, states):
+        """
+        Adapts K to the region states of a detected frame, call it after the frame is processed.
+
+        Args:
+            states (ndarray | None): region_states of the frame, None when nothing was matched yet
+        """
+        # No states on either side means nothing was detected in between, which is stable as well
+        stable = (states is None and self.states is None) or (
+            states is not None and self.states is not None and np.array_equal(states, self.states)
+        )
+        self.stride = min(self.stride * 2, self.max_stride) if stable else 1
+        self.states = None if states is None else states.copy()
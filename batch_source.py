@@ -0,0 +1,202 @@
+import collections
+import json
+import os
+import queue
+import re
+import threading
+
+from PIL import Image
+
+from image_pyramid import TilePyramid
+
+try:
+    import cv2
+except ImportError:  # only needed for video sources
+    cv2 = None
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+class BatchSource:
+    """Ordered list of images to label, either the files of a folder or frames sampled from a video."""
+
+    def __init__(self, names, json_paths, loader):
+        """
+        Initializes the source, use from_folder() or from_video() to build one.
+
+        Args:
+            names (list): display name per image
+            json_paths (list): region file path per image
+            loader (callable): index -> PIL.Image, called from the prefetch thread
+        """
+        self.names = names
+        self.json_paths = json_paths
+        self.loader = loader
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def from_folder(cls, folder):
+        files = sorted(f for f in os.listdir(folder) if f.lower().endswith(IMAGE_EXTENSIONS))
+        paths = [os.path.join(folder, f) for f in files]
+        json_paths = [re.sub(r"\.(jpg|jpeg|png|bmp)$", "", p, flags=re.IGNORECASE) + "_bounding_boxes.json" for p in paths]
+
+        def load(index):
+            image = Image.open(paths[index])
+            image.load()
+            return image
+
+        return cls(files, json_paths, load)
+
+    @classmethod
+    def from_video(cls, video_path, every=30, max_frames=None):
+        """
+        Samples every n-th frame of a video.
+
+        Args:
+            video_path (str): video file
+            every (int): frame step between samples
+            max_frames (int): stop after this many samples
+        """
+        if cv2 is None:
+            raise ImportError("opencv-python is required to label video frames")
+        cap = cv2.VideoCapture(video_path)
+        try:
+            if not cap.isOpened():
+                raise IOError(f"Cannot open video {video_path}")
+            indices = list(range(0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), max(1, every)))[:max_frames]
+        finally:
+            cap.release()
+        stem = os.path.splitext(video_path)[0]
+
+        def load(index):
+            # A capture per frame, so no decoder stays open once the frame is extracted
+            cap = cv2.VideoCapture(video_path)
+            try:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, indices[index])
+                ok, frame = cap.read()
+            finally:
+                cap.release()
+            if not ok:
+                raise IOError(f"Cannot read frame {indices[index]} of {video_path}")
+            return Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+        names = [f"{os.path.basename(stem)} frame {i}" for i in indices]
+        json_paths = [f"{stem}_frame_{i:06d}_bounding_boxes.json" for i in indices]
+        return cls(names, json_paths, load)
+
+
+class PrefetchCache:
+    """Decodes the images around the current one on a background thread into a bounded cache of warm tile pyramids."""
+
+    def __init__(self, source, view_size, radius=1, max_items=5):
+        """
+        Initializes the cache and starts the prefetch thread.
+
+        Args:
+            source (BatchSource): images to load
+            view_size (tuple): (width, height) of the canvas, the first view is rendered ahead
+            radius (int): images prefetched before and after the current one
+            max_items (int): decoded images kept in memory
+        """
+        self.source = source
+        self.view_size = view_size
+        self.radius = radius
+        self.max_items = max(max_items, 2 * radius + 1)
+        self.cache = collections.OrderedDict()  # index -> TilePyramid or Exception
+        self.current = 0
+        self.closed = False
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self._run, name="batch-prefetch", daemon=True)
+        self.thread.start()
+
+    def _wanted(self):
+        """Indices around the current one, nearest first."""
+        order = [self.current]
+        for step in range(1, self.radius + 1):
+            order += [self.current + step, self.current - step]
+        return [i for i in order if 0 <= i < len(self.source)]
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.closed and all(i in self.cache for i in self._wanted()):
+                    self.cond.wait()
+                if self.closed:
+                    return
+                index = next(i for i in self._wanted() if i not in self.cache)
+            try:
+                pyramid = TilePyramid(self.source.loader(index))
+                # Render the full view once so its tiles are in the pyramid cache before it is shown
+                pyramid.render((0, 0, pyramid.width, pyramid.height), self.view_size, Image.BILINEAR)
+            except Exception as e:
+                pyramid = e
+            with self.cond:
+                self.cache[index] = pyramid
+                wanted = set(self._wanted())
+                for stale in [i for i in self.cache if i not in wanted]:
+                    if len(self.cache) <= self.max_items:
+                        break
+                    del self.cache[stale]
+                self.cond.notify_all()
+
+    def get(self, index):
+        """
+        Makes index the current image and returns its pyramid, waiting only if it was not prefetched.
+
+        Raises:
+            Exception: whatever loading the image raised
+        """
+        with self.cond:
+            self.current = index
+            self.cond.notify_all()
+            while index not in self.cache and not self.closed:
+                self.cond.wait()
+            pyramid = self.cache.get(index)
+        if isinstance(pyramid, Exception):
+            raise pyramid
+        return pyramid
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        self.thread.join()
+
+
+class AsyncSaver:
+    """Writes region files from a background thread, each file is replaced atomically."""
+
+    def __init__(self, on_error=None):
+        """
+        Args:
+            on_error (callable): called with (path, exception) from the writer thread when a save fails
+        """
+        self.on_error = on_error
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="batch-autosave", daemon=True)
+        self.thread.start()
+
+    def save(self, path, data):
+        self.queue.put((path, data))
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            path, data = item
+            try:
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(data, f, indent=4)
+                os.replace(tmp_path, path)
+            except Exception as e:
+                if self.on_error is not None:
+                    self.on_error(path, e)
+
+    def close(self):
+        """Writes everything still queued and stops the thread."""
+        self.queue.put(None)
+        self.thread.join()
@@ -0,0 +1,173 @@
+"""
+Offline benchmark of Managing_Parts.process_data on synthetic layouts and detections.
+
+No model weights are needed: the YOLO model is replaced by a stub that only carries the class names.
+Results are written as JSON so CI can compare them against a stored baseline:
+
+    python benchmarks/bench_process_data.py --output bench.json
+    python benchmarks/bench_process_data.py --output bench.json --baseline benchmarks/baseline.json --tolerance 0.25
+
+benchmarks/baseline.json was recorded on a single-core x86_64 machine (see its "meta"), regenerate it
+with --output on the CI runner before using it as a gate there.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+import yaml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from infer_Detection import Managing_Parts  # noqa: E402
+from region_assignment import synthetic_boxes, synthetic_layout  # noqa: E402
+
+
+class StubModel:
+    """Stands in for YOLO, process_data only reads the class names."""
+
+    def __init__(self, class_info):
+        self.names = dict(enumerate(class_info))
+
+
+def frame_shape(path):
+    frame = cv2.imread(path) if os.path.exists(path) else None
+    return frame.shape if frame is not None else (1080, 1920, 3)
+
+
+def make_manager(num_regions, class_info, shape, workdir):
+    polygons, class_ids = synthetic_layout(num_regions, len(class_info), width=shape[1], height=shape[0])
+    layout = [{"points": p.tolist(), "class": class_info[c]} for p, c in zip(polygons, class_ids)]
+    json_path = os.path.join(workdir, f"layout_{num_regions}.json")
+    with open(json_path, "w") as f:
+        json.dump(layout, f)
+    return Managing_Parts(model_path=None, json_path=json_path, class_info=class_info, model=StubModel(class_info))
+
+
+def bench_case(management, base_frame, num_detections, infer_draw, repeat, warmup):
+    shape = base_frame.shape
+    boxes, clss = synthetic_boxes(num_detections, len(management.class_info), width=shape[1], height=shape[0])
+    boxes, clss = boxes.astype(np.float32), clss.astype(np.int64)
+    confs = np.random.default_rng(2).uniform(0.25, 1.0, num_detections).astype(np.float32)
+    frame = np.empty_like(base_frame)
+
+    for _ in range(warmup):
+        np.copyto(frame, base_frame)
+        management.process_data(frame, boxes, clss, confs, infer_draw)
+
+    times = []
+    for _ in range(repeat):
+        np.copyto(frame, base_frame)
+        start = time.perf_counter()
+        management.process_data(frame, boxes, clss, confs, infer_draw)
+        times.append(time.perf_counter() - start)
+
+    # Memory is traced on a separate call, tracemalloc would skew the timings
+    np.copyto(frame, base_frame)
+    tracemalloc.start()
+    management.process_data(frame, boxes, clss, confs, infer_draw)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    times = np.array(times)
+    return {
+        "mean_ms": float(times.mean() * 1e3),
+        "p50_ms": float(np.median(times) * 1e3),
+        "p95_ms": float(np.quantile(times, 0.95) * 1e3),
+        "fps": float(1.0 / times.mean()),
+        "peak_alloc_kb": peak / 1024,
+    }
+
+
+def case_key(result):
+    return result["regions"], result["detections"], result["infer_draw"]
+
+
+def compare(results, baseline_path, tolerance, metric="p50_ms"):
+    """
+    Compares results against a baseline file.
+
+    Returns:
+        regressions (list): (case, baseline, current) for cases slower than baseline * (1 + tolerance)
+    """
+    with open(baseline_path, "r") as f:
+        baseline = {case_key(r): r for r in json.load(f)["results"]}
+    regressions = []
+    for result in results:
+        reference = baseline.get(case_key(result))
+        if reference is None:
+            continue
+        ratio = result[metric] / max(reference[metric], 1e-9)
+        print(f"  {case_key(result)}: {reference[metric]:.3f} -> {result[metric]:.3f} ms ({ratio:.2f}x)")
+        if ratio > 1 + tolerance:
+            regressions.append((case_key(result), reference[metric], result[metric]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline process_data benchmark")
+    parser.add_argument("--regions", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--detections", type=int, nargs="+", default=[0, 10, 100, 1000])
+    parser.add_argument("--frame", default=os.path.join(ROOT, "frame_5.jpg"), help="image whose size is used")
+    parser.add_argument("--classes", default=os.path.join(ROOT, "data.yaml"))
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--output", default="bench_process_data.json")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown of p50")
+    args = parser.parse_args()
+
+    with open(args.classes, "r") as f:
+        class_info = yaml.safe_load(f)["names"]
+    shape = frame_shape(args.frame)
+    base_frame = np.random.default_rng(0).integers(0, 255, shape, dtype=np.uint8)
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for num_regions in args.regions:
+            management = make_manager(num_regions, class_info, shape, workdir)
+            for num_detections in args.detections:
+                for infer_draw in (False, True):
+                    stats = bench_case(management, base_frame, num_detections, infer_draw, args.repeat, args.warmup)
+                    result = {"regions": num_regions, "detections": num_detections, "infer_draw": infer_draw, **stats}
+                    results.append(result)
+                    print(
+                        f"regions {num_regions:>5}  detections {num_detections:>5}  draw {infer_draw!s:>5}  "
+                        f"p50 {stats['p50_ms']:8.3f} ms  p95 {stats['p95_ms']:8.3f} ms  "
+                        f"{stats['fps']:9.1f} fps  peak {stats['peak_alloc_kb']:9.1f} KiB"
+                    )
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "frame_shape": list(shape),
+            "repeat": args.repeat,
+            "timestamp": time.time(),
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        print(f"Comparing p50 against {args.baseline} (tolerance {args.tolerance:.0%})")
+        regressions = compare(results, args.baseline, args.tolerance)
+        if regressions:
+            for key, before, after in regressions:
+                print(f"REGRESSION {key}: {before:.3f} ms -> {after:.3f} ms")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
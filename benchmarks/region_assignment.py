@@ -0,0 +1,95 @@
+"""
+Scaling benchmark: per-pair cv2.pointPolygonTest loop vs. RegionSet.assign.
+
+Usage:
+    python benchmarks/region_assignment.py --regions 10 100 1000 --boxes 50 200
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from region_matching import RegionSet, CORRECT, INCORRECT, EMPTY, box_centers, count_states  # noqa: E402
+
+
+def synthetic_layout(num_regions, num_classes, width=1920, height=1080, seed=0):
+    """Grid of small rectangular slots covering the frame, like a parts tray."""
+    rng = np.random.default_rng(seed)
+    cols = int(np.ceil(np.sqrt(num_regions * width / height)))
+    rows = int(np.ceil(num_regions / cols))
+    cell_w, cell_h = width / cols, height / rows
+    polygons = []
+    for i in range(num_regions):
+        r, c = divmod(i, cols)
+        x1, y1 = int(c * cell_w + 2), int(r * cell_h + 2)
+        x2, y2 = int((c + 1) * cell_w - 2), int((r + 1) * cell_h - 2)
+        polygons.append(np.array([[x1, y1], [x2, y1], [x2, y2], [x1, y2]], dtype=np.int32))
+    return polygons, rng.integers(0, num_classes, num_regions)
+
+
+def synthetic_boxes(num_boxes, num_classes, width=1920, height=1080, seed=1):
+    rng = np.random.default_rng(seed)
+    x1 = rng.uniform(0, width - 40, num_boxes)
+    y1 = rng.uniform(0, height - 40, num_boxes)
+    wh = rng.uniform(10, 120, (num_boxes, 2))
+    boxes = np.stack((x1, y1, x1 + wh[:, 0], y1 + wh[:, 1]), axis=1)
+    return boxes, rng.integers(0, num_classes, num_boxes).astype(np.float64)
+
+
+def legacy_assign(polygons, class_ids, boxes, clss):
+    """The original Managing_Parts.process_data region loop, without drawing."""
+    states = []
+    for points, class_name in zip(polygons, class_ids):
+        points_array = points.reshape((-1, 1, 2))
+        state = EMPTY
+        for box, cls in zip(boxes, clss):
+            x_center = int((box[0] + box[2]) / 2)
+            y_center = int((box[1] + box[3]) / 2)
+            if cv2.pointPolygonTest(points_array, (x_center, y_center), False) >= 0:
+                state = CORRECT if class_name == cls else INCORRECT
+                break
+        states.append(state)
+    return np.array(states, dtype=np.int8)
+
+
+def timeit(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--regions", type=int, nargs="+", default=[10, 100, 500, 1000])
+    parser.add_argument("--boxes", type=int, nargs="+", default=[20, 100, 300])
+    parser.add_argument("--classes", type=int, default=7)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'regions':>8} {'boxes':>6} {'loop ms':>10} {'vector ms':>10} {'speedup':>8} {'tested':>8}  counts")
+    for num_regions in args.regions:
+        polygons, class_ids = synthetic_layout(num_regions, args.classes)
+        regions = RegionSet(polygons, class_ids)
+        for num_boxes in args.boxes:
+            boxes, clss = synthetic_boxes(num_boxes, args.classes)
+            box_list, cls_list = boxes.tolist(), clss.tolist()
+            t_loop, legacy = timeit(lambda: legacy_assign(polygons, class_ids, box_list, cls_list), args.repeat)
+            t_vec, (states, _) = timeit(lambda: regions.assign(box_centers(boxes), clss), args.repeat)
+            assert np.array_equal(legacy, states), "vectorized assignment disagrees with the legacy loop"
+            # Share of box/region pairs that survive the grid and bounds checks and reach the polygon test
+            tested = len(regions.candidates(box_centers(boxes))[0]) / max(num_regions * num_boxes, 1)
+            print(
+                f"{num_regions:>8} {num_boxes:>6} {t_loop * 1e3:>10.2f} {t_vec * 1e3:>10.2f} "
+                f"{t_loop / max(t_vec, 1e-9):>7.1f}x {tested:>8.2%}  {count_states(states)}"
+            )
+
+
+if __name__ == "__main__":
+    main()
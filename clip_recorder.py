@@ -0,0 +1,155 @@
+import logging
+import os
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from region_matching import INCORRECT
+
+LOGGER = logging.getLogger("parts_clips")
+
+# Encoder messages besides the ring slots to write
+_END = "end"
+_STOP = None
+
+
+class ClipRecorder:
+    """Keeps the last seconds of frames in a preallocated ring and writes clips only around region state changes."""
+
+    def __init__(self, out_dir, frame_shape, fps, pre_seconds=2.0, post_seconds=5.0, trigger="incorrect", fourcc="mp4v", encoder_queue=8):
+        """
+        Allocates the ring and starts the encoder thread.
+
+        Frames are copied into the ring on every call of record, nothing is encoded until a trigger.
+        A clip holds the pre_seconds before the triggering frame and runs until post_seconds after
+        the last trigger, so a change during the post-roll extends the clip. The ring holds the
+        pre-roll plus encoder_queue frames, frames the encoder has not written yet are never
+        overwritten and record waits for them instead. It takes
+        (pre_seconds * fps + encoder_queue + 1) * height * width * 3 bytes, about 430 MB at
+        1080p30 with the defaults.
+
+        Args:
+            out_dir (str): folder the clips are written to
+            frame_shape (tuple): (height, width, 3) of the frames
+            fps (float): frame rate of the stream and of the clips
+            pre_seconds (float): seconds kept before a trigger, the ring takes pre_seconds * fps frames of memory
+            post_seconds (float): seconds recorded after the last trigger
+            trigger (str): "incorrect" when a region turns incorrect, "change" on any region state change
+            fourcc (str): codec of the clips
+            encoder_queue (int): frames the encoder may fall behind record before record waits for it
+        """
+        assert trigger in {"incorrect", "change"}, f"Unknown clip trigger {trigger}"
+        self.out_dir = out_dir
+        self.fps = fps or 30
+        self.trigger = trigger
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc)
+        self.pre_frames = max(int(round(pre_seconds * self.fps)), 0)
+        self.post_frames = max(int(round(post_seconds * self.fps)), 1)
+        self.ring = np.empty((self.pre_frames + max(int(encoder_queue), 1) + 1, *frame_shape), dtype=np.uint8)
+        self.pinned = [0] * len(self.ring)  # queued writes per slot
+        self.released = threading.Condition()
+        self.count = 0  # frames recorded so far, the slot of frame n is n % len(ring)
+        self.remaining = 0  # post-roll frames left in the open clip, 0 when no clip is open
+        self.previous = None
+        self.clips = []
+        self.errors = []
+        self.tasks = queue.Queue()
+        os.makedirs(out_dir, exist_ok=True)
+        self.thread = threading.Thread(target=self._encode, name="clip-encoder", daemon=True)
+        self.thread.start()
+
+    def _triggered(self, management):
+        states = management.region_states
+        if states is None:
+            return None
+        # The first frame and a reloaded region set with another region count only set the baseline
+        if self.previous is None or len(self.previous) != len(states):
+            self.previous = states.copy()
+            return None
+        changed = states != self.previous
+        if self.trigger == "incorrect":
+            changed &= states == INCORRECT
+        self.previous = states.copy()
+        return np.flatnonzero(changed) if changed.any() else None
+
+    def _queue(self, frame_number):
+        slot = frame_number % len(self.ring)
+        with self.released:
+            self.pinned[slot] += 1
+        self.tasks.put(slot)
+
+    def record(self, frame, management, frame_index=None):
+        """
+        Adds a processed frame and opens or extends a clip when the region states of management trigger.
+
+        Args:
+            frame (ndarray): annotated frame
+            management (Managing_Parts): manager whose last process_data result belongs to frame
+            frame_index (int, optional): stream index of the frame, used in the clip name
+        """
+        if self.errors:
+            raise self.errors[0]
+        slot = self.count % len(self.ring)
+        with self.released:
+            while self.pinned[slot]:
+                self.released.wait()
+        self.ring[slot] = frame
+
+        regions = self._triggered(management)
+        if regions is not None:
+            if not self.remaining:
+                name = f"clip_{time.strftime('%Y%m%d_%H%M%S')}_{self.count if frame_index is None else frame_index:08d}.avi"
+                path = os.path.join(self.out_dir, name)
+                self.clips.append(path)
+                self.tasks.put(path)
+                for n in range(max(self.count - self.pre_frames, 0), self.count):
+                    self._queue(n)
+                LOGGER.info("Clip %s started by regions %s", path, regions.tolist())
+            self.remaining = self.post_frames + 1
+        if self.remaining:
+            self._queue(self.count)
+            self.remaining -= 1
+            if not self.remaining:
+                self.tasks.put(_END)
+        self.count += 1
+
+    def _encode(self):
+        writer = None
+        try:
+            while True:
+                task = self.tasks.get()
+                if task is _STOP:
+                    break
+                if task == _END:
+                    writer.release()
+                    writer = None
+                elif isinstance(task, str):
+                    h, w = self.ring.shape[1:3]
+                    writer = cv2.VideoWriter(task, self.fourcc, self.fps, (w, h))
+                else:
+                    writer.write(self.ring[task])
+                    with self.released:
+                        self.pinned[task] -= 1
+                        self.released.notify_all()
+        except Exception as e:
+            self.errors.append(e)
+            # Unblock record, which raises the error on its next call
+            with self.released:
+                self.pinned = [0] * len(self.ring)
+                self.released.notify_all()
+        finally:
+            if writer is not None:
+                writer.release()
+
+    def close(self):
+        """Finishes the open clip with the frames recorded so far and waits for the encoder."""
+        if self.remaining:
+            self.remaining = 0
+            self.tasks.put(_END)
+        self.tasks.put(_STOP)
+        self.thread.join()
+        if self.errors:
+            raise self.errors[0]
@@ -0,0 +1,107 @@
+import collections
+import math
+
+from PIL import Image
+
+
+class TilePyramid:
+    """Lazily built multi-resolution tile pyramid of an image with an LRU tile cache."""
+
+    def __init__(self, image, tile_size=512, cache_tiles=256):
+        """
+        Initializes the pyramid, no tile is rendered until it is first needed.
+
+        Level 0 tiles are crops of the full-resolution image, every tile of level k is
+        the 2x box-filtered reduction of the four level k-1 tiles below it.
+
+        Args:
+            image (PIL.Image): full-resolution source image
+            tile_size (int): tile edge in pixels
+            cache_tiles (int): tiles kept in the LRU cache
+        """
+        self.image = image.convert("RGB") if image.mode not in ("RGB", "L") else image
+        self.tile_size = tile_size
+        self.cache_tiles = cache_tiles
+        self.cache = collections.OrderedDict()
+        self.width, self.height = self.image.size
+        self.levels = 1
+        while max(self.width, self.height) > tile_size * 2 ** (self.levels - 1):
+            self.levels += 1
+
+    def level_size(self, level):
+        scale = 2**level
+        return max(1, math.ceil(self.width / scale)), max(1, math.ceil(self.height / scale))
+
+    def tile(self, level, tx, ty):
+        """
+        Returns one tile, rendering it (and the tiles below it) on a cache miss.
+
+        Args:
+            level (int): pyramid level, 0 is full resolution
+            tx (int), ty (int): tile column and row
+
+        Returns:
+            tile (PIL.Image): tile image, smaller than tile_size at the right and bottom edges
+        """
+        key = (level, tx, ty)
+        tile = self.cache.get(key)
+        if tile is not None:
+            self.cache.move_to_end(key)
+            return tile
+
+        t = self.tile_size
+        w, h = self.level_size(level)
+        box = (tx * t, ty * t, min((tx + 1) * t, w), min((ty + 1) * t, h))
+        if level == 0:
+            tile = self.image.crop(box)
+            tile.load()
+        else:
+            # Stitch the child tiles covering this tile and halve them
+            cw, ch = self.level_size(level - 1)
+            span = (box[0] * 2, box[1] * 2, min(box[2] * 2, cw), min(box[3] * 2, ch))
+            mosaic = Image.new(self.image.mode, (span[2] - span[0], span[3] - span[1]))
+            for cy in range(span[1] // t, -(-span[3] // t)):
+                for cx in range(span[0] // t, -(-span[2] // t)):
+                    mosaic.paste(self.tile(level - 1, cx, cy), (cx * t - span[0], cy * t - span[1]))
+            tile = mosaic.resize((box[2] - box[0], box[3] - box[1]), Image.BOX)
+
+        self.cache[key] = tile
+        while len(self.cache) > self.cache_tiles:
+            self.cache.popitem(last=False)
+        return tile
+
+    def level_for(self, scale):
+        """Coarsest level that still has at least one source pixel per output pixel."""
+        if scale <= 1:
+            return 0
+        return min(int(math.floor(math.log2(scale))), self.levels - 1)
+
+    def render(self, box, size, resample=Image.LANCZOS):
+        """
+        Renders a region of the full-resolution image, composing only the visible tiles.
+
+        Args:
+            box (tuple): (x1, y1, x2, y2) region in full-resolution pixels, may be fractional
+            size (tuple): (width, height) of the output image
+            resample (int): PIL resampling filter for the final resize
+
+        Returns:
+            image (PIL.Image): the rendered viewport
+        """
+        x1, y1, x2, y2 = box
+        out_w, out_h = size
+        level = self.level_for(min((x2 - x1) / out_w, (y2 - y1) / out_h))
+        scale = 2**level
+        w, h = self.level_size(level)
+        lx1, ly1, lx2, ly2 = x1 / scale, y1 / scale, min(x2 / scale, w), min(y2 / scale, h)
+
+        t = self.tile_size
+        tx1, ty1 = int(lx1) // t, int(ly1) // t
+        tx2, ty2 = (math.ceil(lx2) - 1) // t, (math.ceil(ly2) - 1) // t
+        origin_x, origin_y = tx1 * t, ty1 * t
+        mosaic = Image.new(self.image.mode, (min((tx2 + 1) * t, w) - origin_x, min((ty2 + 1) * t, h) - origin_y))
+        for ty in range(ty1, ty2 + 1):
+            for tx in range(tx1, tx2 + 1):
+                mosaic.paste(self.tile(level, tx, ty), (tx * t - origin_x, ty * t - origin_y))
+        crop = (lx1 - origin_x, ly1 - origin_y, lx2 - origin_x, ly2 - origin_y)
+        return mosaic.resize((out_w, out_h), resample, box=crop)
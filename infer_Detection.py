@@ -1,10 +1,47 @@
 import cv2
 import numpy as np
-from ultralytics import YOLO
 import json
-from ultralytics.utils.plotting import Annotator
-from ultralytics.utils.checks import check_imshow
 import random
+from concurrent.futures import ThreadPoolExecutor
+from region_matching import EMPTY, RegionSet, box_centers, count_states, match_regions
+from region_layout import RegionLayout, is_layout_path
+from region_overlay import RegionRenderer
+from occupancy import TrackOccupancy
+from region_reload import LOGGER, RegionWatcher
+from metrics import NULL_METRICS, StartupReport
+
+def detections_from_results(results):
+    """
+    Detections of one frame as contiguous NumPy arrays, without per-box Python objects.
+
+    Args:
+        results (Results | list): Ultralytics results of a single frame, or the list returned by track/predict
+
+    Returns:
+        boxes (ndarray): (N, 4) float32 xyxy boxes
+        clss (ndarray): (N,) int64 class ids
+        confs (ndarray): (N,) float32 confidences
+        ids (ndarray | None): (N,) int64 track ids, None when the results are not tracked
+    """
+    if isinstance(results, (list, tuple)):
+        results = results[0]
+    data = results.boxes.cpu().numpy().data
+    tracked = results.boxes.is_track
+    boxes = np.ascontiguousarray(data[:, :4], dtype=np.float32)
+    ids = data[:, 4].astype(np.int64) if tracked else None
+    confs = np.ascontiguousarray(data[:, -2], dtype=np.float32)
+    clss = data[:, -1].astype(np.int64)
+    return boxes, clss, confs, ids
+
+
+def analytics_annotator(im0):
+    """Annotator with display_analytics, which moved from Annotator to SolutionAnnotator in Ultralytics 8.3."""
+    try:
+        from ultralytics.solutions.solutions import SolutionAnnotator as Annotator
+    except ImportError:
+        from ultralytics.utils.plotting import Annotator
+    return Annotator(im0)
+
 
 class Managing_Parts:
     """Manages parking occupancy and availability using YOLOv8 for real-time monitoring and visualization."""
@@ -19,26 +56,56 @@ class Managing_Parts:
         empty_region_color=(0, 0, 255),
         margin=10,
         json_path = None,
-        class_info = None
+        class_info = None,
+        model = None,
+        incremental = False,
+        move_threshold = 4.0,
+        debounce = 1,
+        metrics = None,
+        watch = False,
+        watch_interval = 1.0,
+        startup = None,
+        server = None
     ):
         """
         Initializes the parking management system with a YOLOv8 model and visualization settings.
 
         Args:
-            model_path (str): Path to the YOLOv8 model.
+            model_path (str): Path to the YOLOv8 model, or its ONNX/OpenVINO export from inference_backends.resolve_model.
             txt_color (tuple): RGB color tuple for text.
             bg_color (tuple): RGB color tuple for background.
             occupied_region_color (tuple): RGB color tuple for occupied regions.
             available_region_color (tuple): RGB color tuple for available regions.
             margin (int): Margin for text display.
+            json_path (str): Region JSON from Selection_Tool, or a binary .rlay layout from region_layout.py.
+            model (YOLO, optional): Already loaded model to share between several managers, otherwise
+                the model is loaded on a background thread and the first use of self.model waits for it.
+                An InferencePool is passed to PoolRunner instead, the model then only provides the class names.
+            incremental (bool): Update occupancy from track IDs, re-matching only changed tracks.
+            move_threshold (float): Center displacement in pixels that re-matches a track in incremental mode.
+            debounce (int): Frames a region state must persist before it is counted in incremental mode.
+            metrics (StageMetrics, optional): Collects per-stage timings of process_data.
+            watch (bool): Reload json_path when it changes, the new regions are swapped in between frames.
+            watch_interval (float): Seconds between checks of json_path in watch mode.
+            startup (StartupReport, optional): Collects the startup phases up to the first processed frame.
+            server (OccupancyServer, optional): Publishes every processed frame's region states to local clients.
         """
         # Model path and initialization
         self.model_path = model_path
-        self.model = self.load_model()
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        self.startup = startup if startup is not None else StartupReport()
+        self.server = server
+        self.model_future = None
+        self.model = model
+        if model is None:
+            # Load while the regions are parsed and the caller opens its video
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-load")
+            self.model_future = executor.submit(self.load_model)
+            executor.shutdown(wait=False)
         self.default_color_list = [txt_color, bg_color, correct_region_color, incorrect_region_color, empty_region_color]
         # Labels dictionary
         self.labels_dict = {"Correct_parts": 0, "Inceorrect_parts":0, "Empty_parts": 0}
-        self.env_check = check_imshow(warn=True)
+        self._env_check = None
         # Visualization details
         self.margin = margin
         self.bg_color = bg_color
@@ -46,17 +113,61 @@ class Managing_Parts:
         self.correct_region_color = correct_region_color
         self.empty_region_color = empty_region_color
         self.incorrect_region_color = incorrect_region_color
-        self.manager_json = self.parking_regions_extraction(json_path)
         self.class_info = class_info
         self.clas_dict = {self.class_info[i] : i  for i in range(len(self.class_info))}
+        with self.startup.phase("regions"):
+            self.manager_json, self.layout, self.regions = self.load_regions(json_path)
+        self.region_states = None  # per-region EMPTY/CORRECT/INCORRECT of the last processed frame
+        self.region_matches = None  # per-region index of the matched box, -1 when empty
+        self.region_classes = None  # per-region class id of the matched box, -1 when empty
+        self.region_confs = None  # per-region confidence of the matched box, 0 when empty
+        self.occupancy = TrackOccupancy(self.regions, move_threshold, debounce) if incremental else None
+        self.renderer = RegionRenderer(self.regions, empty_region_color, correct_region_color, incorrect_region_color)
+        self.frame_shape = None  # shape of the last processed frame, reloaded outlines are prepared for it
+        self.watcher = RegionWatcher(json_path, self.compile_reload, watch_interval) if watch else None
         self.class_color = [self.get_random_color(i) for i in range(len(self.class_info))]
         self.window_name = "Ultralytics YOLOv8 Parking Management System"
         # Check if environment supports imshow
 
     def load_model(self):
-        """Load the Ultralytics YOLO model for inference and analytics."""
+        """Load the Ultralytics YOLO model for inference and analytics, .pt weights or an inference_backends export."""
+        with self.startup.phase("model_load"):
+            from ultralytics import YOLO
+
+            return YOLO(self.model_path, task="detect")
+
+    @property
+    def model(self):
+        """The YOLO model, the first access waits for the background load."""
+        if self._model is None and self.model_future is not None:
+            self._model = self.model_future.result()
+        return self._model
 
-        return YOLO(self.model_path)
+    @model.setter
+    def model(self, model):
+        self._model = model
+
+    @property
+    def env_check(self):
+        """Whether the environment supports imshow, checked on first use."""
+        if self._env_check is None:
+            from ultralytics.utils.checks import check_imshow
+
+            self._env_check = check_imshow(warn=True)
+        return self._env_check
+
+    def warmup(self, imgsz):
+        """
+        Runs the model once on a blank frame of the stream resolution, so the first real frame
+        does not pay for the model setup, layer fusing and buffer allocation.
+
+        Args:
+            imgsz (tuple): (height, width) of the stream frames
+        """
+        with self.startup.phase("model_wait"):
+            model = self.model
+        with self.startup.phase("warmup"):
+            model.predict(np.zeros((imgsz[0], imgsz[1], 3), dtype=np.uint8), verbose=False)
 
     def load_class_info(self, json):
         if not json == None:
@@ -84,73 +195,124 @@ class Managing_Parts:
         with open(json_file, "r") as f:
             return json.load(f)
 
-    def process_data(self, im0, boxes, clss, confs=None, infer_draw=False):
+    def load_regions(self, json_path, previous=None):
         """
-        Process the model data for parking lot management.
+        Reads and compiles a region file.
 
         Args:
-            json_data (str): json data for parking lot management
-            im0 (ndarray): inference image
-            boxes (list): bounding boxes data
-            clss (list): bounding boxes classes list
+            json_path (str): region JSON, or a binary .rlay layout that is memory-mapped instead of parsed
+            previous (RegionSet, optional): regions being replaced, unchanged ones are not recompiled
+
+        Returns:
+            manager_json (list | None), layout (RegionLayout | None), regions (RegionSet)
+        """
+        if is_layout_path(json_path):
+            layout = RegionLayout.load(json_path)
+            return None, layout, layout.regions_for(self.clas_dict)
+        manager_json = self.parking_regions_extraction(json_path)
+        return manager_json, None, RegionSet.from_json(manager_json, self.clas_dict, previous=previous)
+
+    def compile_reload(self, json_path):
+        """
+        Prepares a changed region file on the watcher thread, so that swapping it in costs nothing on the frame path.
+
+        Regions that match_regions finds unchanged keep their compiled edges and outline pixels,
+        only new and edited regions are compiled and rasterized.
 
         Returns:
-            filled_slots (int): total slots that are filled in parking lot
-            empty_slots (int): total slots that are available in parking lot
+            update (tuple): (manager_json, layout, regions, renderer, base regions, old_index)
         """
+        base, base_renderer = self.regions, self.renderer
+        manager_json, layout, regions = self.load_regions(json_path, previous=base)
+        old_index = regions.old_index if regions.old_index is not None else match_regions(base, regions)
+        renderer = RegionRenderer(
+            regions, self.empty_region_color, self.correct_region_color, self.incorrect_region_color,
+            previous=base_renderer if base_renderer.regions is base else None, old_index=old_index,
+        )
+        if self.frame_shape is not None:
+            renderer.outline_layer(self.frame_shape)
+        return manager_json, layout, regions, renderer, base, old_index
+
+    def apply_reload(self, update):
+        """Swaps in a compiled region update, tracks and the state of unchanged regions are kept."""
+        manager_json, layout, regions, renderer, base, old_index = update
+        if base is not self.regions:
+            old_index = match_regions(self.regions, regions)
+        if self.occupancy is not None:
+            self.occupancy.rebase(regions, old_index)
+        self.manager_json, self.layout, self.regions, self.renderer = manager_json, layout, regions, renderer
+        LOGGER.info("Regions reloaded: %d regions, %d unchanged", len(regions), int((old_index >= 0).sum()))
 
-        annotator = Annotator(im0)
-        empty_slots, correct_filled_slots, incorrect_filled_slots = len(self.manager_json), 0, 0
-        for region in self.manager_json:
-            points_array = np.array(region["points"], dtype=np.int32).reshape((-1, 1, 2))
-            class_name = self.clas_dict[region["class"]]
-            correct_region = False
-            incorrect_region = False
-            emtpy_region = False
-
-            for box, cls, conf in zip(boxes, clss, confs):
-                x_center = int((box[0] + box[2]) / 2)
-                y_center = int((box[1] + box[3]) / 2)
-                text = f"{self.model.names[int(cls)]}"
-                if infer_draw:
-                    x1, y1, x2, y2 = map(lambda x: int(x), box)
-                    label = f"{self.class_info[int(cls)]}: {conf:.2f}"
-                    cv2.rectangle(im0, (x1, y1),(x2, y2), self.class_color[int(cls)], 2)
-                    cv2.putText(im0, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, self.class_color[int(cls)], 2)
-                # annotator.display_objects_labels(
-                #     im0, text, self.txt_color, self.bg_color, x_center, y_center, self.margin
-                # )
-                dist = cv2.pointPolygonTest(points_array, (x_center, y_center), False)
-                if dist >= 0:
-                    if class_name == cls:
-                        correct_region = True
-                        break
-                    else:
-                        incorrect_region = True
-                        break
+    def process_data(self, im0, boxes, clss=None, confs=None, infer_draw=False, track_ids=None, observed=True):
+        """
+        Process the model data for parking lot management.
+
+        Args:
+            im0 (ndarray): inference image
+            boxes (Results | ndarray | list): Ultralytics results of the frame, or (N, 4) xyxy bounding boxes
+            clss (ndarray | list): bounding boxes classes, taken from the results when boxes is a results object
+            confs (ndarray | list): bounding boxes confidences
+            infer_draw (bool): draw the detections
+            track_ids (ndarray | list, optional): tracker ID per box, used by incremental mode
+            observed (bool): False when the boxes are carried over from an earlier frame (adaptive stride),
+                incremental mode then redraws the reported states without counting the frame towards the debounce
+        """
+        self.frame_shape = im0.shape
+        if self.watcher is not None:
+            update = self.watcher.take()
+            if update is not None:
+                with self.metrics.stage("region_reload"):
+                    self.apply_reload(update)
+        if clss is None:
+            with self.metrics.stage("to_numpy"):
+                boxes, clss, confs, ids = detections_from_results(boxes)
+            if ids is None and self.occupancy is not None:
+                # Untracked results hold no confirmed track, so every known track has departed
+                boxes, clss, confs, ids = boxes[:0], clss[:0], confs[:0], np.zeros(0, dtype=np.int64)
+            track_ids = ids if track_ids is None else track_ids
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        clss = np.asarray(clss).reshape(-1).astype(np.int64)
+        confs = np.zeros(len(clss), dtype=np.float32) if confs is None else np.asarray(confs, dtype=np.float32).reshape(-1)
+        with self.metrics.stage("region_match"):
+            if self.occupancy is not None and track_ids is not None:
+                if observed:
+                    states = self.occupancy.update(track_ids, box_centers(boxes), clss).copy()
                 else:
-                    emtpy_region = True
-
-            if correct_region:
-                color = self.correct_region_color
-            elif incorrect_region:
-                color = self.incorrect_region_color
-            elif emtpy_region:
-                color = self.empty_region_color
-            cv2.polylines(im0, [points_array], isClosed=True, color=color, thickness=2)
-            if correct_region:
-                correct_filled_slots += 1
-                empty_slots -= 1
-            if incorrect_region:
-                incorrect_filled_slots += 1
-                empty_slots -= 1
+                    states = self.occupancy.states.copy()
+                matches = self.occupancy.matches(track_ids)
+            else:
+                states, matches = self.regions.assign(box_centers(boxes), clss)
+            previous_classes, previous_confs = self.region_classes, self.region_confs
+            self.region_states, self.region_matches = states, matches
+            hit = matches >= 0
+            self.region_classes = np.full(len(matches), -1, dtype=np.int64)
+            self.region_confs = np.zeros(len(matches), dtype=np.float32)
+            self.region_classes[hit] = clss[matches[hit]]
+            self.region_confs[hit] = confs[matches[hit]]
+            if self.occupancy is not None and previous_classes is not None and len(previous_classes) == len(matches):
+                # A reported holder missing from this frame keeps the class and confidence it was last seen with
+                held = ~hit & (states != EMPTY)
+                self.region_classes[held] = previous_classes[held]
+                self.region_confs[held] = previous_confs[held]
+            correct_filled_slots, incorrect_filled_slots, empty_slots = count_states(states)
+
+        with self.metrics.stage("render"):
+            self.renderer.draw_regions(im0, states)
+            if infer_draw:
+                self.renderer.draw_detections(im0, boxes, clss, confs, self.class_info, self.class_color)
 
         self.labels_dict["Correct_parts"] = correct_filled_slots
         self.labels_dict["Empty_parts"] = empty_slots
         self.labels_dict["Inceorrect_parts"] = incorrect_filled_slots
 
 
-        annotator.display_analytics(im0, self.labels_dict, self.txt_color, self.bg_color, self.margin)
+        with self.metrics.stage("display_analytics"):
+            analytics_annotator(im0).display_analytics(im0, self.labels_dict, self.txt_color, self.bg_color, self.margin)
+        if self.server is not None:
+            with self.metrics.stage("publish"):
+                self.server.publish(self, im0)
+        if self.startup.first_frame is None:
+            self.startup.frame_done()
 
     def display_frames(self, im0):
         """
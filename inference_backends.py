@@ -0,0 +1,226 @@
+"""
+Optimized CPU inference backends for the detector weights.
+
+The .pt weights are exported once per backend, input size and precision and the exports are
+cached next to the weights, where YOLO loads them like the original model:
+
+    torch      the .pt weights as they are
+    onnx       ONNX Runtime,  <stem>_<imgsz>[_int8].onnx
+    openvino   OpenVINO,      <stem>_<imgsz>[_int8]_openvino_model/
+
+"auto" times every installed backend at the stream resolution on first use and remembers the
+fastest in <stem>.backend.json, later runs only read that file. Exports and benchmarks run in a
+separate interpreter, so the caller never imports torch and can still fork workers afterwards.
+
+    python inference_backends.py 0916_cpcm_S_KFold_v8.pt --frame-size 1920x1080
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKENDS = ("torch", "onnx", "openvino")
+# Python modules every backend needs to export and to run
+BACKEND_MODULES = {"torch": ("torch",), "onnx": ("onnx", "onnxruntime"), "openvino": ("openvino",)}
+
+
+def backend_available(backend):
+    return all(importlib.util.find_spec(module) is not None for module in BACKEND_MODULES[backend])
+
+
+def available_backends():
+    return [backend for backend in BACKENDS if backend_available(backend)]
+
+
+def export_path(model_path, backend, imgsz=640, int8=False):
+    """Path of the cached export of model_path, the weights themselves for torch."""
+    if backend == "torch":
+        return model_path
+    stem = os.path.splitext(model_path)[0] + f"_{imgsz}" + ("_int8" if int8 else "")
+    return stem + (".onnx" if backend == "onnx" else "_openvino_model")
+
+
+def _is_fresh(path, model_path):
+    return os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(model_path)
+
+
+def _export(model_path, backend, imgsz, int8, data):
+    from ultralytics import YOLO
+
+    path = export_path(model_path, backend, imgsz, int8)
+    model = YOLO(model_path)
+    if backend == "openvino":
+        # OpenVINO quantizes with NNCF, calibrated on the data yaml
+        exported = model.export(format="openvino", imgsz=imgsz, int8=int8, data=data) if int8 else model.export(format="openvino", imgsz=imgsz)
+    else:
+        exported = model.export(format="onnx", imgsz=imgsz)
+    exported = str(exported)
+    if int8 and backend == "onnx":
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(exported, path, weight_type=QuantType.QUInt8)
+        os.remove(exported)
+        return path
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.replace(exported, path)
+    return path
+
+
+def _benchmark(paths, frame_shape, runs, warmup):
+    import numpy as np
+    from ultralytics import YOLO
+
+    frame = np.random.default_rng(0).integers(0, 256, tuple(frame_shape), dtype=np.uint8)
+    timings = {}
+    for backend, path in paths.items():
+        model = YOLO(path, task="detect")
+        for _ in range(warmup):
+            model.predict(frame, verbose=False)
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            model.predict(frame, verbose=False)
+            times.append(time.perf_counter() - start)
+        timings[backend] = sorted(times)[len(times) // 2]
+    return timings
+
+
+def _isolated(fn, *args):
+    """
+    Runs a function of this module in a fresh interpreter and returns its JSON result.
+
+    Unlike a spawned multiprocessing child the interpreter does not re-run the caller's
+    __main__, which park_manager.py is as a plain script.
+    """
+    code = "import json, sys, inference_backends as b; json.dump(getattr(b, sys.argv[1])(*json.loads(sys.argv[2])), open(sys.argv[3], 'w'))"
+    paths = [os.path.dirname(os.path.abspath(__file__)), os.environ.get("PYTHONPATH")]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in paths if p))
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, "result.json")
+        subprocess.run([sys.executable, "-c", code, fn.__name__, json.dumps(args), out], check=True, env=env)
+        with open(out, "r") as f:
+            return json.load(f)
+
+
+def export_model(model_path, backend, imgsz=640, int8=False, data="data.yaml"):
+    """
+    Exports the weights for a backend unless a cached export newer than the weights exists.
+
+    Args:
+        model_path (str): .pt weights
+        backend (str): one of BACKENDS
+        imgsz (int): input size of the export, frames are letterboxed to it
+        int8 (bool): quantize the export, dynamically for ONNX and calibrated on data for OpenVINO
+        data (str): dataset yaml used to calibrate the OpenVINO INT8 export
+
+    Returns:
+        path (str): weights to load with YOLO
+    """
+    path = export_path(model_path, backend, imgsz, int8)
+    if backend == "torch" or _is_fresh(path, model_path):
+        return path
+    if not backend_available(backend):
+        raise RuntimeError(f"Backend {backend} needs {', '.join(BACKEND_MODULES[backend])} installed")
+    return _isolated(_export, model_path, backend, imgsz, int8, data)
+
+
+def benchmark_backends(model_path, frame_shape, backends=None, imgsz=640, int8=False, runs=20, warmup=3, data="data.yaml"):
+    """
+    Times single-frame inference of every backend.
+
+    Args:
+        model_path (str): .pt weights
+        frame_shape (tuple): (height, width, 3) of the stream frames
+        backends (list, optional): backends to time, every installed one when None
+        runs (int): timed inferences per backend, the median is reported
+        warmup (int): untimed inferences before the timed ones
+
+    Returns:
+        timings (dict): backend -> median seconds per frame
+    """
+    backends = backends or available_backends()
+    paths = {backend: export_model(model_path, backend, imgsz, int8, data) for backend in backends}
+    return _isolated(_benchmark, paths, list(frame_shape), runs, warmup)
+
+
+def select_backend(model_path, frame_shape, imgsz=640, int8=False, data="data.yaml", cache_path=None):
+    """
+    The fastest installed backend for the weights, benchmarked once per machine and stream resolution.
+
+    Args:
+        model_path (str): .pt weights
+        frame_shape (tuple): (height, width, 3) of the stream frames
+        cache_path (str, optional): benchmark results file, <stem>.backend.json when None
+
+    Returns:
+        backend (str): one of BACKENDS
+    """
+    backends = available_backends()
+    if len(backends) == 1:
+        return backends[0]
+    cache_path = cache_path or os.path.splitext(model_path)[0] + ".backend.json"
+    key = json.dumps(
+        {
+            "frame_shape": list(frame_shape),
+            "imgsz": imgsz,
+            "int8": int8,
+            "weights_mtime": os.path.getmtime(model_path),
+            "machine": [platform.machine(), platform.processor(), os.cpu_count()],
+            "backends": backends,
+        },
+        sort_keys=True,
+    )
+    cache = {}
+    if os.path.exists(cache_path):
+        with open(cache_path, "r") as f:
+            cache = json.load(f)
+    if key not in cache:
+        timings = benchmark_backends(model_path, frame_shape, backends, imgsz, int8, data=data)
+        cache[key] = {"backend": min(timings, key=timings.get), "timings": timings}
+        with open(cache_path, "w") as f:
+            json.dump(cache, f, indent=2)
+    return cache[key]["backend"]
+
+
+def resolve_model(model_path, backend="auto", frame_shape=None, imgsz=640, int8=False, data="data.yaml"):
+    """
+    Weights to load for a backend, exported and benchmarked as needed.
+
+    Args:
+        model_path (str): .pt weights
+        backend (str): one of BACKENDS, or "auto" for the fastest installed one
+        frame_shape (tuple): (height, width, 3) of the stream frames, needed for "auto"
+
+    Returns:
+        path (str): .pt, .onnx or OpenVINO model folder that YOLO loads
+    """
+    if backend == "auto":
+        backend = select_backend(model_path, frame_shape, imgsz, int8, data)
+    return export_model(model_path, backend, imgsz, int8, data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the detector to every installed backend and time them")
+    parser.add_argument("model", help=".pt weights")
+    parser.add_argument("--frame-size", default="1920x1080", help="WxH of the stream frames")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--int8", action="store_true")
+    parser.add_argument("--data", default="data.yaml", help="calibration dataset of the OpenVINO INT8 export")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    w, h = (int(v) for v in args.frame_size.lower().split("x"))
+    timings = benchmark_backends(args.model, (h, w, 3), imgsz=args.imgsz, int8=args.int8, runs=args.runs, data=args.data)
+    for backend, seconds in sorted(timings.items(), key=lambda item: item[1]):
+        print(f"{backend:10s} {1000 * seconds:8.1f} ms  {export_path(args.model, backend, args.imgsz, args.int8)}")
+
+
+if __name__ == "__main__":
+    main()
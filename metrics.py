@@ -0,0 +1,262 @@
+import collections
+import contextlib
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+LOGGER = logging.getLogger("parts_metrics")
+QUANTILES = (0.5, 0.95, 0.99)
+# Reusable no-op context handed out while metrics are disabled
+_NULL_CONTEXT = contextlib.nullcontext()
+
+
+class _Timer:
+    """Context manager recording its elapsed time into a StageMetrics stage."""
+
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class StageMetrics:
+    """Per-stage latency histograms, FPS and queue depths with periodic log summaries and Prometheus export."""
+
+    def __init__(self, enabled=True, summary_interval=10.0, window=2048, prefix="parts"):
+        """
+        Initializes the metric store.
+
+        Args:
+            enabled (bool): when False every call is a no-op
+            summary_interval (float): seconds between log summaries from maybe_log(), 0 disables them
+            window (int): latest samples per stage kept for the percentiles
+            prefix (str): metric name prefix in the Prometheus export
+        """
+        self.enabled = enabled
+        self.summary_interval = summary_interval
+        self.window = window
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.samples = collections.defaultdict(lambda: collections.deque(maxlen=self.window))
+        self.totals = collections.defaultdict(lambda: [0, 0.0])  # stage -> [count, seconds]
+        self.gauges = {}
+        self.frames = 0
+        self.frame_times = collections.deque(maxlen=self.window)
+        self.started = time.perf_counter()
+        self.last_summary = self.started
+        self.server = None
+
+    def stage(self, name):
+        """
+        Times a block of code as one sample of a stage.
+
+        Args:
+            name (str): stage name, e.g. "model.track"
+        """
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return _Timer(self, name)
+
+    def record(self, name, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.samples[name].append(seconds)
+            total = self.totals[name]
+            total[0] += 1
+            total[1] += seconds
+
+    def gauge(self, name, value):
+        """Sets an instantaneous value such as a queue depth."""
+        if self.enabled:
+            self.gauges[name] = value
+
+    def frame(self):
+        """Marks one fully processed frame for the FPS figures."""
+        if not self.enabled:
+            return
+        with self.lock:
+            self.frames += 1
+            self.frame_times.append(time.perf_counter())
+
+    def summary(self):
+        """
+        Snapshot of all metrics.
+
+        Returns:
+            summary (dict): {"frames", "fps", "fps_recent", "gauges", "stages": {name: {"count", "mean", "p50", ...}}}
+        """
+        with self.lock:
+            samples = {name: np.array(values) for name, values in self.samples.items()}
+            totals = {name: tuple(total) for name, total in self.totals.items()}
+            frame_times = list(self.frame_times)
+            frames = self.frames
+        elapsed = time.perf_counter() - self.started
+        recent = (len(frame_times) - 1) / (frame_times[-1] - frame_times[0]) if len(frame_times) > 1 else 0.0
+        stages = {}
+        for name, values in samples.items():
+            count, seconds = totals[name]
+            stage = {"count": count, "mean": seconds / max(count, 1)}
+            if len(values):
+                for q, value in zip(QUANTILES, np.quantile(values, QUANTILES)):
+                    stage[f"p{int(q * 100)}"] = float(value)
+            stages[name] = stage
+        return {
+            "frames": frames,
+            "fps": frames / elapsed if elapsed > 0 else 0.0,
+            "fps_recent": recent,
+            "gauges": dict(self.gauges),
+            "stages": stages,
+        }
+
+    def format_summary(self):
+        summary = self.summary()
+        lines = [f"frames {summary['frames']}  fps {summary['fps']:.1f}  recent fps {summary['fps_recent']:.1f}"]
+        for name, stage in sorted(summary["stages"].items()):
+            lines.append(
+                f"  {name:<20} n={stage['count']:<7} mean {stage['mean'] * 1e3:7.2f} ms  p50 {stage.get('p50', 0) * 1e3:7.2f}"
+                f"  p95 {stage.get('p95', 0) * 1e3:7.2f}  p99 {stage.get('p99', 0) * 1e3:7.2f}"
+            )
+        if summary["gauges"]:
+            lines.append("  " + "  ".join(f"{name}={value}" for name, value in sorted(summary["gauges"].items())))
+        return "\n".join(lines)
+
+    def maybe_log(self):
+        """Logs a summary when summary_interval seconds passed since the last one."""
+        if not self.enabled or not self.summary_interval:
+            return
+        now = time.perf_counter()
+        if now - self.last_summary >= self.summary_interval:
+            self.last_summary = now
+            LOGGER.info("Stage timings\n%s", self.format_summary())
+
+    def prometheus(self):
+        """Renders the metrics in the Prometheus text exposition format."""
+        summary = self.summary()
+        p = self.prefix
+        lines = [
+            f"# TYPE {p}_frames_total counter",
+            f"{p}_frames_total {summary['frames']}",
+            f"# TYPE {p}_fps gauge",
+            f"{p}_fps {summary['fps']:.6f}",
+            f"{p}_fps_recent {summary['fps_recent']:.6f}",
+            f"# TYPE {p}_stage_seconds summary",
+        ]
+        with self.lock:
+            totals = {name: tuple(total) for name, total in self.totals.items()}
+        for name, stage in sorted(summary["stages"].items()):
+            for q in QUANTILES:
+                key = f"p{int(q * 100)}"
+                if key in stage:
+                    lines.append(f'{p}_stage_seconds{{stage="{name}",quantile="{q}"}} {stage[key]:.9f}')
+            count, seconds = totals[name]
+            lines.append(f'{p}_stage_seconds_sum{{stage="{name}"}} {seconds:.9f}')
+            lines.append(f'{p}_stage_seconds_count{{stage="{name}"}} {count}')
+        if summary["gauges"]:
+            lines.append(f"# TYPE {p}_gauge gauge")
+            for name, value in sorted(summary["gauges"].items()):
+                lines.append(f'{p}_gauge{{name="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        """Writes the Prometheus text to a file, e.g. for a node_exporter textfile collector."""
+        if not self.enabled:
+            return
+        with open(path, "w") as f:
+            f.write(self.prometheus())
+
+    def serve(self, port=9108, host="127.0.0.1"):
+        """
+        Serves the Prometheus text on http://host:port/metrics from a daemon thread.
+
+        Args:
+            port (int): listening port
+            host (str): listening address
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") not in {"", "/metrics"}:
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True).start()
+        return self.server
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+class StartupReport:
+    """Wall-clock breakdown of the startup phases, including ones running on other threads, up to the first processed frame."""
+
+    def __init__(self, start=None):
+        """
+        Args:
+            start (float, optional): time.perf_counter() value the phase offsets are measured from, now when None
+        """
+        self.start = time.perf_counter() if start is None else start
+        self.lock = threading.Lock()
+        self.phases = []  # (name, offset, seconds, thread name)
+        self.first_frame = None
+
+    def record(self, name, start, end=None):
+        end = time.perf_counter() if end is None else end
+        with self.lock:
+            self.phases.append((name, start - self.start, end - start, threading.current_thread().name))
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Times a block of code as one startup phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start)
+
+    def frame_done(self):
+        """Marks the first processed frame and logs the report, later calls do nothing."""
+        if self.first_frame is None:
+            self.first_frame = time.perf_counter() - self.start
+            LOGGER.info("Startup\n%s", self.format())
+
+    def format(self):
+        with self.lock:
+            phases = sorted(self.phases, key=lambda phase: phase[1])
+        lines = [
+            f"  {name:<14} at {offset * 1e3:8.1f} ms  took {seconds * 1e3:8.1f} ms  [{thread}]"
+            for name, offset, seconds, thread in phases
+        ]
+        if self.first_frame is not None:
+            lines.append(f"  first processed frame after {self.first_frame * 1e3:.1f} ms")
+        return "\n".join(lines)
+
+
+# Shared disabled instance for callers that were not given any metrics
+NULL_METRICS = StageMetrics(enabled=False)
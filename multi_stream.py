@@ -0,0 +1,163 @@
+import threading
+
+import cv2
+import yaml
+
+from infer_Detection import Managing_Parts
+from tracking import StreamTracker
+
+
+class LatestFrameReader:
+    """Reads a video source on a background thread and hands out its most recent frame."""
+
+    def __init__(self, source, drop_stale=True):
+        """
+        Opens the source and starts reading.
+
+        Args:
+            source (str | int): video file, stream URL or camera index
+            drop_stale (bool): overwrite frames that were not consumed yet (live cameras); when False the
+                reader waits for every frame to be taken (video files)
+        """
+        self.cap = cv2.VideoCapture(source)
+        assert self.cap.isOpened(), f"Error reading video source {source}"
+        self.drop_stale = drop_stale
+        self.frame = None
+        self.ended = False
+        self.condition = threading.Condition()
+        self.notify = None  # threading.Event set whenever a frame arrives or the source ends, see MultiStreamManager.run
+        self.thread = threading.Thread(target=self._read, daemon=True)
+        self.thread.start()
+
+    def _read(self):
+        while True:
+            success, frame = self.cap.read()
+            with self.condition:
+                if not self.drop_stale:
+                    self.condition.wait_for(lambda: self.frame is None or self.ended)
+                if not success or self.ended:
+                    self.ended = True
+                    self.condition.notify_all()
+                else:
+                    self.frame = frame
+                    self.condition.notify_all()
+            if self.notify is not None:
+                self.notify.set()
+            if self.ended:
+                break
+        self.cap.release()
+
+    def latest(self, wait=True):
+        """
+        Takes the newest unread frame.
+
+        Args:
+            wait (bool): block until a frame is available or the source ends
+
+        Returns:
+            frame (ndarray | None): the frame, or None when the source ended or nothing new arrived
+        """
+        with self.condition:
+            if wait:
+                self.condition.wait_for(lambda: self.frame is not None or self.ended)
+            frame, self.frame = self.frame, None
+            self.condition.notify_all()
+            return frame
+
+    def release(self):
+        with self.condition:
+            self.ended = True
+            self.condition.notify_all()
+        self.thread.join()
+
+
+class MultiStreamManager:
+    """Runs several camera streams through one shared model with a single batched predict call per step."""
+
+    def __init__(self, model_path, class_info, json_paths, tracker="bytetrack.yaml", **kwargs):
+        """
+        Loads the model once and builds one region manager and tracker per stream.
+
+        Args:
+            model_path (str): Path to the YOLOv8 model.
+            class_info (list): class names
+            json_paths (list): region layout json, one per stream
+            tracker (str): tracker yaml used for every stream
+            **kwargs: visualization settings forwarded to every Managing_Parts
+        """
+        self.streams = []
+        model = None
+        for i, json_path in enumerate(json_paths):
+            management = Managing_Parts(model_path, json_path=json_path, class_info=class_info, model=model, **kwargs)
+            management.window_name = f"{management.window_name} [{i}]"
+            model = management.model
+            self.streams.append(management)
+        self.model = model
+        self.trackers = [StreamTracker(tracker) for _ in json_paths]
+
+    def process_frames(self, frames, infer_draw=False):
+        """
+        Detects on all frames in one batch, then tracks and matches regions per stream.
+
+        Args:
+            frames (list): one frame per stream, None for streams without a new frame
+            infer_draw (bool): draw detections on the frames
+        """
+        active = [i for i, frame in enumerate(frames) if frame is not None]
+        if not active:
+            return
+        results = self.model.predict([frames[i] for i in active], verbose=False)
+        for i, result in zip(active, results):
+            tracks = self.trackers[i].update(result.boxes, frames[i])
+            # Frames without tracks are processed too, so departures clear the regions
+            self.streams[i].process_data(frames[i], tracks[:, :4], tracks[:, 6], tracks[:, 5], infer_draw, tracks[:, 4])
+
+    def run(self, readers, infer_draw=False, writers=None, idle_timeout=0.5):
+        """
+        Processes the latest frames of all readers until every source ended.
+
+        Each step takes whatever frames are new without waiting on any single reader, so a stalled
+        stream only drops out of the batch and never holds up the others.
+
+        Args:
+            readers (list): one LatestFrameReader per stream
+            infer_draw (bool): draw detections on the frames
+            writers (list, optional): one cv2.VideoWriter (or None) per stream
+            idle_timeout (float): longest wait in seconds for any reader when no stream has a new frame
+        """
+        arrived = threading.Event()
+        for reader in readers:
+            reader.notify = arrived
+        while True:
+            # Cleared before polling, so a frame arriving after the poll ends the next wait at once
+            arrived.clear()
+            frames = [reader.latest(wait=False) for reader in readers]
+            if all(frame is None for frame in frames):
+                if all(reader.ended for reader in readers):
+                    break
+                arrived.wait(idle_timeout)
+                continue
+            self.process_frames(frames, infer_draw)
+            for i, frame in enumerate(frames):
+                if frame is None:
+                    continue
+                self.streams[i].display_frames(frame)
+                if writers and writers[i] is not None:
+                    writers[i].write(frame)
+
+
+if __name__ == "__main__":
+    sources = ["test_video.mp4"]
+    json_paths = ["frame_5_bounding_boxes.json"]
+    yaml_path = "data.yaml"
+    infer_draw = True
+
+    with open(yaml_path, "r") as file:
+        classes = yaml.safe_load(file)["names"]
+
+    manager = MultiStreamManager("0916_cpcm_S_KFold_v8.pt", classes, json_paths)
+    readers = [LatestFrameReader(source, drop_stale=not str(source).endswith(".mp4")) for source in sources]
+    manager.run(readers, infer_draw)
+    for reader in readers:
+        reader.release()
+    cv2.destroyAllWindows()
@@ -0,0 +1,185 @@
+import numpy as np
+
+from region_matching import EMPTY, CORRECT, INCORRECT
+
+
+class TrackOccupancy:
+    """Incremental region occupancy keyed by tracker IDs, re-evaluating only the tracks that changed."""
+
+    def __init__(self, regions, move_threshold=4.0, debounce=1):
+        """
+        Initializes an empty occupancy state.
+
+        A region is held by the oldest (lowest ID) track whose center lies inside it. A track is
+        re-matched against the regions only when it appears, disappears, changes class or its center
+        moves more than move_threshold pixels from where it was last matched.
+
+        Args:
+            regions (RegionSet): compiled regions
+            move_threshold (float): center displacement in pixels that triggers re-matching
+            debounce (int): frames a new region state must persist before it is reported
+        """
+        self.regions = regions
+        self.move_threshold = move_threshold
+        self.debounce = max(int(debounce), 1)
+        num_regions = len(regions)
+        # Tracks sorted by ID, with the center and class they were last matched at
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.centers = np.zeros((0, 2), dtype=np.int64)
+        self.classes = np.zeros(0, dtype=np.int64)
+        self.track_regions = {}
+        self.region_tracks = [set() for _ in range(num_regions)]
+        self.raw_states = np.full(num_regions, EMPTY, dtype=np.int8)
+        self.states = np.full(num_regions, EMPTY, dtype=np.int8)
+        self.raw_owners = np.full(num_regions, -1, dtype=np.int64)  # holder of the raw state
+        self.owners = np.full(num_regions, -1, dtype=np.int64)  # holder of the reported state
+        self.pending = {}  # region -> frames its raw state has differed from the reported state
+        self.changed_tracks = 0  # tracks re-matched in the last update
+
+    def update(self, ids, centers, classes):
+        """
+        Applies one frame of tracks.
+
+        Args:
+            ids (ndarray): (P,) track IDs
+            centers (ndarray): (P, 2) integer box centers
+            classes (ndarray): (P,) class id per track
+
+        Returns:
+            states (ndarray): (R,) debounced EMPTY, CORRECT or INCORRECT per region
+        """
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        centers = np.asarray(centers, dtype=np.int64).reshape(-1, 2)
+        classes = np.asarray(classes).reshape(-1).astype(np.int64)
+        order = np.argsort(ids, kind="stable")
+        ids, centers, classes = ids[order], centers[order], classes[order]
+
+        pos = np.clip(np.searchsorted(self.ids, ids), 0, max(len(self.ids) - 1, 0))
+        known = self.ids[pos] == ids if len(self.ids) else np.zeros(len(ids), dtype=bool)
+        changed = ~known
+        if known.any():
+            moved = np.abs(centers[known] - self.centers[pos[known]]).max(axis=1) > self.move_threshold
+            changed[known] = moved | (classes[known] != self.classes[pos[known]])
+        departed = self.ids[~np.isin(self.ids, ids, assume_unique=True)]
+
+        dirty = set()
+        for track_id in departed.tolist():
+            for r in self.track_regions.pop(track_id, ()):
+                self.region_tracks[r].discard(track_id)
+                dirty.add(r)
+
+        changed_idx = np.flatnonzero(changed)
+        self.changed_tracks = len(changed_idx)
+        if len(changed_idx):
+            changed_centers = centers[changed_idx]
+            point_idx, region_idx = self.regions.candidates(changed_centers)
+            inside = self.regions.contains_pairs(changed_centers, point_idx, region_idx)
+            point_idx, region_idx = point_idx[inside], region_idx[inside]
+            splits = np.searchsorted(point_idx, np.arange(1, len(changed_idx)))
+            for track_id, new_regions in zip(ids[changed_idx].tolist(), np.split(region_idx, splits)):
+                new_regions = new_regions.tolist()
+                for r in self.track_regions.get(track_id, ()):
+                    self.region_tracks[r].discard(track_id)
+                    dirty.add(r)
+                for r in new_regions:
+                    self.region_tracks[r].add(track_id)
+                    dirty.add(r)
+                self.track_regions[track_id] = new_regions
+
+        # Unchanged tracks keep the center they were matched at, so slow drift still adds up
+        if len(ids):
+            keep = ~changed
+            centers[keep] = self.centers[pos[keep]]
+        self.ids, self.centers, self.classes = ids, centers, classes
+
+        self._resolve(dirty)
+        self._debounce(dirty)
+        return self.states
+
+    def _resolve(self, dirty):
+        """Recomputes the raw holder and raw state of the given regions."""
+        for r in dirty:
+            tracks = self.region_tracks[r]
+            if not tracks:
+                self.raw_owners[r], self.raw_states[r] = -1, EMPTY
+                continue
+            owner = min(tracks)
+            owner_class = self.classes[np.searchsorted(self.ids, owner)]
+            self.raw_owners[r] = owner
+            self.raw_states[r] = CORRECT if owner_class == self.regions.class_ids[r] else INCORRECT
+
+    def rebase(self, regions, old_index):
+        """
+        Moves the occupancy onto a reloaded region set without forgetting the tracks.
+
+        Unchanged regions keep their reported state and debounce progress, every current track
+        is matched once against the new set and new or changed regions report their state at once.
+
+        Args:
+            regions (RegionSet): new compiled regions
+            old_index (ndarray): (R_new,) index of the same region in the current set, -1 for new or changed ones
+        """
+        old_index = np.asarray(old_index, dtype=np.int64).reshape(-1)
+        kept = old_index >= 0
+        num_regions = len(regions)
+        states = np.full(num_regions, EMPTY, dtype=np.int8)
+        states[kept] = self.states[old_index[kept]]
+        owners = np.full(num_regions, -1, dtype=np.int64)
+        owners[kept] = self.owners[old_index[kept]]
+        new_of_old = dict(zip(old_index[kept].tolist(), np.flatnonzero(kept).tolist()))
+        self.pending = {new_of_old[r]: value for r, value in self.pending.items() if r in new_of_old}
+
+        self.regions = regions
+        self.track_regions = {}
+        self.region_tracks = [set() for _ in range(num_regions)]
+        self.raw_states = np.full(num_regions, EMPTY, dtype=np.int8)
+        self.raw_owners = np.full(num_regions, -1, dtype=np.int64)
+        if len(self.ids):
+            point_idx, region_idx = regions.candidates(self.centers)
+            inside = regions.contains_pairs(self.centers, point_idx, region_idx)
+            for p, r in zip(point_idx[inside].tolist(), region_idx[inside].tolist()):
+                track_id = int(self.ids[p])
+                self.track_regions.setdefault(track_id, []).append(r)
+                self.region_tracks[r].add(track_id)
+        self._resolve(range(num_regions))
+        # New regions and kept ones whose raw state agrees report their raw holder, the others keep the reported one
+        agree = ~kept | (states == self.raw_states)
+        states[~kept] = self.raw_states[~kept]
+        owners[agree] = self.raw_owners[agree]
+        self.states, self.owners = states, owners
+
+    def _debounce(self, dirty):
+        """Commits raw states that persisted debounce frames, the reported holder only changes together with its state."""
+        for r in dirty | set(self.pending):
+            if self.raw_states[r] == self.states[r]:
+                self.owners[r] = self.raw_owners[r]
+                self.pending.pop(r, None)
+                continue
+            last_state, frames = self.pending.get(r, (self.raw_states[r], 0))
+            frames = frames + 1 if last_state == self.raw_states[r] else 1
+            if frames >= self.debounce:
+                self.states[r] = self.raw_states[r]
+                self.owners[r] = self.raw_owners[r]
+                self.pending.pop(r, None)
+            else:
+                self.pending[r] = (self.raw_states[r], frames)
+
+    def matches(self, ids):
+        """
+        Index of the detection holding the reported state of each region, in the caller's (unsorted) ID order.
+
+        Args:
+            ids (ndarray): (P,) track IDs of the current frame
+
+        Returns:
+            matches (ndarray): (R,) detection index per region, -1 when empty or the holder was not detected
+        """
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        matches = np.full(len(self.owners), -1, dtype=np.int64)
+        if not len(ids):
+            return matches
+        order = np.argsort(ids, kind="stable")
+        pos = np.clip(np.searchsorted(ids[order], self.owners), 0, len(ids) - 1)
+        found = (ids[order][pos] == self.owners) & (self.states != EMPTY)
+        matches[found] = order[pos[found]]
+        return matches
@@ -0,0 +1,154 @@
+import csv
+import json
+import os
+import queue
+import threading
+import time
+
+from region_matching import EMPTY, CORRECT, INCORRECT
+
+STATE_NAMES = {EMPTY: "empty", CORRECT: "correct", INCORRECT: "incorrect"}
+CSV_FIELDS = ["timestamp", "frame", "region", "region_class", "state", "matched_class", "confidence"]
+
+
+class OccupancyLogWriter:
+    """Streams occupancy records to a JSONL, CSV or Parquet file through a buffered writer thread."""
+
+    def __init__(self, path, mode="change", fmt=None, flush_every=256, max_pending=4096):
+        """
+        Opens the output file and starts the writer thread.
+
+        Args:
+            path (str): output file, the format follows the extension unless fmt is given
+            mode (str): "frame" writes every region on every frame, "change" only the regions whose state
+                or matched class changed since the previous record
+            fmt (str, optional): "jsonl", "csv" or "parquet"
+            flush_every (int): records buffered before they are written out
+            max_pending (int): records queued before log() blocks the caller
+        """
+        assert mode in {"frame", "change"}, f"Unknown log mode {mode}"
+        self.path = path
+        self.mode = mode
+        self.fmt = fmt or os.path.splitext(path)[1].lstrip(".").lower()
+        assert self.fmt in {"jsonl", "csv", "parquet"}, f"Unsupported log format {self.fmt}"
+        self.flush_every = flush_every
+        self.records = queue.Queue(maxsize=max_pending)
+        self.previous = None
+        self.errors = []
+        self.thread = threading.Thread(target=self._write, name="occupancy-log", daemon=True)
+        self.thread.start()
+
+    def log(self, frame_index, management, timestamp=None):
+        """
+        Queues the current region state of a Managing_Parts.
+
+        Args:
+            frame_index (int): index of the processed frame
+            management (Managing_Parts): manager whose last process_data result is logged
+            timestamp (float, optional): wall-clock time of the frame, now when None
+        """
+        if management.region_states is None:
+            return
+        timestamp = time.time() if timestamp is None else timestamp
+        states = management.region_states.tolist()
+        classes = management.region_classes.tolist()
+        confs = management.region_confs.tolist()
+        current = list(zip(states, classes))
+        # A reloaded region set with another region count restarts the comparison
+        if self.previous is not None and len(self.previous) != len(current):
+            self.previous = None
+        changed = [i for i, item in enumerate(current) if self.previous is None or self.previous[i] != item]
+        self.previous = current
+        indices = range(len(states)) if self.mode == "frame" else changed
+        if not indices:
+            return
+
+        regions = []
+        for i in indices:
+            matched = classes[i] >= 0
+            regions.append(
+                {
+                    "region": i,
+                    "region_class": management.class_info[int(management.regions.class_ids[i])],
+                    "state": STATE_NAMES[states[i]],
+                    "matched_class": management.class_info[classes[i]] if matched else None,
+                    "confidence": round(confs[i], 4) if matched else None,
+                }
+            )
+        record = {"timestamp": timestamp, "frame": frame_index, "labels": dict(management.labels_dict), "regions": regions}
+        if self.errors:
+            raise self.errors[0]
+        self.records.put(record)
+
+    def _rows(self, record):
+        for region in record["regions"]:
+            yield {"timestamp": record["timestamp"], "frame": record["frame"], **region}
+
+    def _write(self):
+        try:
+            if self.fmt == "parquet":
+                self._write_parquet()
+            else:
+                self._write_text()
+        except Exception as e:
+            self.errors.append(e)
+            # Keep draining so producers never block on a dead writer
+            while self.records.get() is not None:
+                pass
+
+    def _batches(self):
+        """Yields lists of up to flush_every records until close() is called."""
+        batch = []
+        while True:
+            try:
+                record = self.records.get(timeout=1.0)
+            except queue.Empty:
+                record = False
+            if record is None or record is False or len(batch) >= self.flush_every:
+                if batch:
+                    yield batch
+                batch = []
+            if record is None:
+                return
+            if record is not False:
+                batch.append(record)
+
+    def _write_text(self):
+        with open(self.path, "w", newline="") as f:
+            writer = None
+            if self.fmt == "csv":
+                writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+                writer.writeheader()
+            for batch in self._batches():
+                if writer is None:
+                    f.writelines(json.dumps(record, ensure_ascii=False) + "\n" for record in batch)
+                else:
+                    writer.writerows(row for record in batch for row in self._rows(record))
+                f.flush()
+
+    def _write_parquet(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.schema(
+            [
+                ("timestamp", pa.float64()),
+                ("frame", pa.int64()),
+                ("region", pa.int32()),
+                ("region_class", pa.string()),
+                ("state", pa.string()),
+                ("matched_class", pa.string()),
+                ("confidence", pa.float32()),
+            ]
+        )
+        with pq.ParquetWriter(self.path, schema) as writer:
+            for batch in self._batches():
+                rows = [row for record in batch for row in self._rows(record)]
+                writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+
+    def close(self):
+        """Flushes the queued records and stops the writer thread."""
+        self.records.put(None)
+        self.thread.join()
+        if self.errors:
+            raise self.errors[0]
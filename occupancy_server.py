@@ -0,0 +1,280 @@
+"""
+Local occupancy service: any number of dashboards and PLC bridges read the state of one running
+Managing_Parts instead of running their own detector.
+
+    GET /state          latest snapshot, {"seq", "timestamp", "labels", "regions": [{"region", "region_class", "state", "matched_class", "confidence"}]}
+    GET /labels         latest labels_dict
+    GET /ws             WebSocket, the snapshot on connect and then {"type": "diff"} messages with the changed regions
+    GET /preview.jpg    latest annotated frame, when the preview is enabled
+    GET /preview.mjpg   MJPEG stream of the annotated frames at preview_fps
+
+Reads are answered from the cached snapshot on the server thread, publish only compares the
+region arrays with the previous frame and hands changes over, so clients cost the inference
+loop nothing.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import struct
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from occupancy_log import STATE_NAMES
+
+LOGGER = logging.getLogger("parts_server")
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+MJPEG_BOUNDARY = "frame"
+
+
+class OccupancyServer:
+    """Serves the latest occupancy of a Managing_Parts over HTTP, WebSocket and MJPEG from an asyncio loop thread."""
+
+    def __init__(self, port=8765, host="127.0.0.1", preview_fps=2.0, jpeg_quality=70, client_queue=64):
+        """
+        Starts the server thread and binds the listening socket.
+
+        Args:
+            port (int): listening port, 0 picks a free one, see self.port
+            host (str): listening address, loopback only unless changed
+            preview_fps (float): rate of the JPEG preview, 0 disables it
+            jpeg_quality (int): JPEG quality of the preview
+            client_queue (int): diffs buffered per WebSocket client, a client that falls further behind gets a new snapshot
+        """
+        self.host = host
+        self.preview_interval = 1.0 / preview_fps if preview_fps else None
+        self.jpeg_quality = jpeg_quality
+        self.client_queue = client_queue
+        self.snapshot = {"seq": 0, "timestamp": None, "labels": {}, "regions": []}
+        self.snapshot_json = json.dumps(self.snapshot).encode()
+        self.previous = None  # (states, classes) of the last published frame
+        self.regions = None  # RegionSet of the last published frame
+        self.preview = None  # latest JPEG bytes
+        self.preview_time = 0.0
+        self.preview_version = 0
+        self.subscribers = set()
+        self.loop = asyncio.new_event_loop()
+        self.started = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(port,), name="occupancy-server", daemon=True)
+        self.thread.start()
+        self.started.wait()
+        if self.error is not None:
+            raise self.error
+
+    def _run(self, port):
+        asyncio.set_event_loop(self.loop)
+        self.error = None
+        try:
+            self.server = self.loop.run_until_complete(asyncio.start_server(self._handle, self.host, port))
+            self.port = self.server.sockets[0].getsockname()[1]
+            self.preview_changed = asyncio.Condition()
+        except OSError as e:
+            self.error = e
+            self.started.set()
+            return
+        LOGGER.info("Occupancy server on http://%s:%d", self.host, self.port)
+        self.started.set()
+        self.loop.run_forever()
+        self.loop.close()
+
+    def publish(self, management, frame=None):
+        """
+        Publishes the last process_data result of a Managing_Parts, called on the processing thread.
+
+        Args:
+            management (Managing_Parts): manager whose region_states, region_classes, region_confs and labels_dict are published
+            frame (ndarray, optional): annotated frame for the preview, encoded on the server thread at preview_fps
+        """
+        states, classes = management.region_states, management.region_classes
+        if states is None:
+            return
+        # A reloaded region set may keep the count but change region classes or polygons, clients resynchronize
+        reloaded = management.regions is not self.regions
+        self.regions = management.regions
+        if reloaded or len(self.previous[0]) != len(states):
+            changed = np.arange(len(states))
+        else:
+            changed = np.flatnonzero((states != self.previous[0]) | (classes != self.previous[1]))
+        self.previous = states.copy(), classes.copy()
+        if len(changed):
+            confs = management.region_confs
+            class_info = management.class_info
+            region_classes = management.regions.class_ids
+            regions = {
+                i: {
+                    "region": i,
+                    "region_class": class_info[int(region_classes[i])],
+                    "state": STATE_NAMES[int(states[i])],
+                    "matched_class": class_info[int(classes[i])] if classes[i] >= 0 else None,
+                    "confidence": round(float(confs[i]), 4) if classes[i] >= 0 else None,
+                }
+                for i in changed.tolist()
+            }
+            self.loop.call_soon_threadsafe(self._apply, regions, len(states), dict(management.labels_dict), time.time(), reloaded)
+        now = time.monotonic()
+        if frame is not None and self.preview_interval and now - self.preview_time >= self.preview_interval:
+            self.preview_time = now
+            # Only a copy is made here, the JPEG is encoded off the processing thread
+            self.loop.call_soon_threadsafe(lambda frame=frame.copy(): self.loop.create_task(self._encode_preview(frame)))
+
+    def _apply(self, regions, count, labels, timestamp, resync=False):
+        snapshot = self.snapshot
+        snapshot["regions"] = snapshot["regions"][:count] + [None] * (count - len(snapshot["regions"]))
+        for i, region in regions.items():
+            snapshot["regions"][i] = region
+        snapshot["seq"] += 1
+        snapshot["timestamp"] = timestamp
+        snapshot["labels"] = labels
+        self.snapshot_json = json.dumps(snapshot).encode()
+        diff = json.dumps(
+            {"type": "diff", "seq": snapshot["seq"], "timestamp": timestamp, "labels": labels, "count": count, "regions": list(regions.values())}
+        ).encode()
+        for queue in self.subscribers:
+            if resync or queue.full():
+                # A slow client skips the backlog and resynchronizes from the full snapshot, as do all after a reload
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self._snapshot_message())
+            else:
+                queue.put_nowait(diff)
+
+    def _snapshot_message(self):
+        return b'{"type": "snapshot", ' + self.snapshot_json[1:]
+
+    async def _encode_preview(self, frame):
+        ok, jpeg = await self.loop.run_in_executor(None, cv2.imencode, ".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            return
+        self.preview = jpeg.tobytes()
+        async with self.preview_changed:
+            self.preview_version += 1
+            self.preview_changed.notify_all()
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await reader.readuntil(b"\r\n\r\n")
+            lines = request.decode("latin-1").split("\r\n")
+            method, path = lines[0].split(" ")[:2]
+            headers = {k.strip().lower(): v.strip() for k, _, v in (line.partition(":") for line in lines[1:] if line)}
+            path = path.split("?")[0].rstrip("/") or "/"
+            if method != "GET":
+                await self._respond(writer, 405, b"method not allowed", "text/plain")
+            elif path == "/state":
+                await self._respond(writer, 200, self.snapshot_json, "application/json")
+            elif path == "/labels":
+                await self._respond(writer, 200, json.dumps(self.snapshot["labels"]).encode(), "application/json")
+            elif path == "/ws" and headers.get("upgrade", "").lower() == "websocket":
+                await self._websocket(reader, writer, headers)
+            elif path == "/preview.jpg" and self.preview is not None:
+                await self._respond(writer, 200, self.preview, "image/jpeg")
+            elif path == "/preview.mjpg" and self.preview_interval:
+                await self._mjpeg(writer)
+            else:
+                await self._respond(writer, 404, b"not found", "text/plain")
+        except (asyncio.CancelledError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            # Cancelled on close, or a client that went away or sent a malformed request
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, body, content_type):
+        reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}[status]
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+            f"Cache-Control: no-store\r\nConnection: close\r\n\r\n".encode()
+            + body
+        )
+        await writer.drain()
+
+    async def _mjpeg(self, writer):
+        writer.write(
+            f"HTTP/1.1 200 OK\r\nContent-Type: multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}\r\n"
+            f"Cache-Control: no-store\r\nConnection: close\r\n\r\n".encode()
+        )
+        version = -1
+        while True:
+            async with self.preview_changed:
+                await self.preview_changed.wait_for(lambda: self.preview_version != version)
+                version, jpeg = self.preview_version, self.preview
+            writer.write(f"--{MJPEG_BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n".encode() + jpeg + b"\r\n")
+            await writer.drain()
+
+    async def _websocket(self, reader, writer, headers):
+        key = headers.get("sec-websocket-key")
+        if not key:
+            await self._respond(writer, 400, b"missing Sec-WebSocket-Key", "text/plain")
+            return
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+        writer.write(
+            f"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\nSec-WebSocket-Accept: {accept}\r\n\r\n".encode()
+        )
+        queue = asyncio.Queue(maxsize=self.client_queue)
+        queue.put_nowait(self._snapshot_message())
+        self.subscribers.add(queue)
+        receiver = self.loop.create_task(self._websocket_receive(reader, writer))
+        try:
+            while not receiver.done():
+                getter = self.loop.create_task(queue.get())
+                await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    getter.cancel()
+                    break
+                writer.write(_websocket_frame(0x1, getter.result()))
+                await writer.drain()
+        finally:
+            self.subscribers.discard(queue)
+            receiver.cancel()
+
+    async def _websocket_receive(self, reader, writer):
+        """Answers pings and returns when the client closes or disconnects, client messages are otherwise ignored."""
+        try:
+            await self._websocket_read(reader, writer)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+
+    async def _websocket_read(self, reader, writer):
+        while True:
+            head = await reader.readexactly(2)
+            opcode, length = head[0] & 0x0F, head[1] & 0x7F
+            if length == 126:
+                length = struct.unpack(">H", await reader.readexactly(2))[0]
+            elif length == 127:
+                length = struct.unpack(">Q", await reader.readexactly(8))[0]
+            mask = await reader.readexactly(4) if head[1] & 0x80 else b"\0\0\0\0"
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(await reader.readexactly(length)))
+            if opcode == 0x8:
+                writer.write(_websocket_frame(0x8, payload[:2]))
+                await writer.drain()
+                return
+            if opcode == 0x9:
+                writer.write(_websocket_frame(0xA, payload))
+                await writer.drain()
+
+    async def _shutdown(self):
+        self.server.close()
+        # Open MJPEG and WebSocket streams never end on their own
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+def _websocket_frame(opcode, payload):
+    """One unmasked, unfragmented server frame."""
+    n = len(payload)
+    if n < 126:
+        head = struct.pack(">BB", 0x80 | opcode, n)
+    elif n < 1 << 16:
+        head = struct.pack(">BBH", 0x80 | opcode, 126, n)
+    else:
+        head = struct.pack(">BBQ", 0x80 | opcode, 127, n)
+    return head + payload
@@ -1,44 +1,165 @@
+import time
+startup_start = time.perf_counter()
+import logging
 import cv2
 import yaml
 from infer_Detection import Managing_Parts
+from video_pipeline import PipelinedRunner
+from occupancy_log import OccupancyLogWriter
+from metrics import StageMetrics, StartupReport
+from roi_inference import RoiDetector, RoiTracker
+from worker_pool import InferencePool, PoolRunner
+from inference_backends import resolve_model
+from clip_recorder import ClipRecorder
+from occupancy_server import OccupancyServer
+from adaptive_stride import AdaptiveStride
 
-
-cap = cv2.VideoCapture("test_video.mp4")
+startup = StartupReport(start=startup_start)
+startup.record("imports", startup_start)
+video_path = "test_video.mp4"
 infer_draw = True
-assert cap.isOpened(), "Error reading video file"
-w, h, fps = (int(cap.get(x)) for x in (cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT, cv2.CAP_PROP_FPS))
+pipelined = True  # decode, inference, post-processing and encode on separate pipelined stages
+save_video = True  # write the annotated frames to "parking management.avi"
+clip_dir = None  # e.g. "clips": write only clips around region state changes there, instead of the full video,
+# the 2 s pre-roll is kept in a preallocated frame ring of about 430 MB at 1080p30
+clip_trigger = "incorrect"  # "incorrect" when a region turns incorrect, "change" on any region state change
+log_path = "occupancy_log.jsonl"  # occupancy records (.jsonl, .csv or .parquet), None to disable
+log_mode = "change"  # "change" logs regions whose state changed, "frame" logs every region every frame
+metrics_enabled = True  # per-stage latency histograms, FPS and queue depths
+metrics_path = "metrics.prom"  # Prometheus text file written at the end of the run, None to disable
+metrics_port = None  # serve live metrics on http://127.0.0.1:<port>/metrics
+server_port = None  # e.g. 8765: serve region states on http://127.0.0.1:<port>/state, /ws and /preview.mjpg
+warmup = True  # run one inference at the stream resolution before the first frame
+roi_inference = False  # detect only in windows around the regions instead of the full frame
+adaptive_stride = False  # detect every K frames while the regions are still, back to every frame on motion
+workers = 0  # > 0 detects in that many worker processes fed through shared memory, tracking stays here
+model_path = "0916_cpcm_S_KFold_v8.pt"
+backend = "torch"  # "torch", "onnx", "openvino", or "auto" to benchmark the installed ones once and keep the fastest, exports are cached next to the weights
+int8 = False  # quantized ONNX/OpenVINO export
 cnt = 0
 json_path = "frame_5_bounding_boxes.json"
+watch_regions = True  # swap in edits of json_path while running, without restarting
 yaml_path = "data.yaml"
 
 with open(yaml_path, "r") as file:
     data = yaml.safe_load(file)
     classes = data["names"]
 
-management = Managing_Parts(model_path = "0916_cpcm_S_KFold_v8.pt", class_info = classes, json_path = json_path)
-video_writer = cv2.VideoWriter("parking management.avi", cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+logging.basicConfig(level=logging.INFO)
+metrics = StageMetrics(enabled=metrics_enabled)
+assert not (workers and roi_inference), "ROI inference runs in this process, it cannot be combined with workers"
+assert not (workers and adaptive_stride), "workers detect frames ahead, the stride needs the result of every detection first"
+
+
+def open_video():
+    with startup.phase("video_open"):
+        cap = cv2.VideoCapture(video_path)
+        assert cap.isOpened(), "Error reading video file"
+        return (cap, *(int(cap.get(x)) for x in (cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT, cv2.CAP_PROP_FPS)))
+
+
+cap = pool = None
+if workers or backend != "torch":
+    # The backend benchmark runs at the stream resolution and the workers need the frame shape
+    cap, w, h, fps = open_video()
+if backend != "torch":
+    # Exports and benchmarks run in a separate interpreter, workers can still be forked afterwards
+    with startup.phase("backend"):
+        inference_path = resolve_model(model_path, backend, (h, w, 3), int8=int8, data=yaml_path)
+    # "auto" may still pick the .pt weights themselves
+    assert not (roi_inference and inference_path != model_path), "ROI crops change the input size, exported models have a fixed one"
+    model_path = inference_path
+    logging.info("Inference model: %s", model_path)
+if workers:
+    # Workers are forked before this process loads a model or starts any thread, they warm up their own models.
+    # The capture is reopened afterwards, its decoder may run threads of its own.
+    cap.release()
+    cap = None
+    with startup.phase("workers"):
+        pool = InferencePool(model_path, (h, w, 3), workers)
+if metrics_port:
+    metrics.serve(metrics_port)
+# The model loads on a background thread while the regions are parsed and the video is opened
+server = OccupancyServer(server_port) if server_port else None
+management = Managing_Parts(model_path = model_path, class_info = classes, json_path = json_path, incremental = True, debounce = 3, metrics = metrics, watch = watch_regions, startup = startup, server = server)
+if cap is None:
+    cap, w, h, fps = open_video()
+detector = None
+if roi_inference:
+    roi_detector = RoiDetector(management, (h, w, 3))
+    detector = RoiTracker(roi_detector)
+    logging.info("ROI inference on %d windows, %.0f%% of the full-frame model input", len(roi_detector.windows), 100 * roi_detector.pixel_ratio)
+if warmup and pool is None:
+    if roi_inference:
+        with startup.phase("warmup"):
+            roi_detector.warmup()
+    else:
+        management.warmup((h, w))
+video_writer = cv2.VideoWriter("parking management.avi", cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h)) if save_video and not clip_dir else None
+stride = AdaptiveStride(management) if adaptive_stride else None
+clip_recorder = ClipRecorder(clip_dir, (h, w, 3), fps, trigger=clip_trigger) if clip_dir else None
+event_log = OccupancyLogWriter(log_path, log_mode) if log_path else None
 # Loop through the video frames
 
 
-while cap.isOpened():
+if pool is not None:
+    # The workers and the shared ring must not outlive a failed run
+    try:
+        PoolRunner(management, cap, pool, video_writer, infer_draw, event_log=event_log, clip_recorder=clip_recorder).run()
+    finally:
+        pool.close()
+elif pipelined:
+    PipelinedRunner(management, cap, video_writer, infer_draw, event_log=event_log, detector=detector, clip_recorder=clip_recorder, stride=stride).run()
+
+while cap.isOpened() and not pipelined and pool is None:
     # Read a frame from the video
-    success, frame = cap.read()
+    with metrics.stage("cap.read"):
+        success, frame = cap.read()
     if success:
-        # Run YOLOv8 inference on the frame
-        results = management.model.track(frame, persist=True, show=False)
-
-        if results[0].boxes.id is not None:
-            boxes = results[0].boxes.xyxy.cpu().tolist()
-            clss = results[0].boxes.cls.cpu().tolist()
-            conf = results[0].boxes.conf.cpu().tolist()
+        # Run YOLOv8 inference on the frame, still frames in adaptive stride mode reuse the last results
+        detected = stride is None or stride.check(frame)
+        if detected:
+            with metrics.stage("model.track"):
+                results = (detector or management.model).track(frame, persist=True, show=False)
 
-            management.process_data(frame, boxes, clss, conf, infer_draw)
+        with metrics.stage("process_data"):
+            # Reused results are no new observation, they must not advance the debounce
+            management.process_data(frame, results, infer_draw=infer_draw, observed=detected)
+        if stride is not None and detected:
+            stride.observe(management.region_states)
 
-        management.display_frames(frame)
-        video_writer.write(frame)
+        if event_log is not None:
+            event_log.log(cnt, management)
+        if clip_recorder is not None:
+            with metrics.stage("clip_recorder.record"):
+                clip_recorder.record(frame, management, cnt)
+        cnt += 1
+        with metrics.stage("display_frames"):
+            management.display_frames(frame)
+        if video_writer is not None:
+            with metrics.stage("video_writer.write"):
+                video_writer.write(frame)
+        metrics.frame()
+        metrics.maybe_log()
         # Break the loop if 'q' is pressed
     else:
         break
 cap.release()
-video_writer.release()
+if video_writer is not None:
+    video_writer.release()
+if event_log is not None:
+    event_log.close()
+if clip_recorder is not None:
+    clip_recorder.close()
+if management.watcher is not None:
+    management.watcher.close()
+if server is not None:
+    server.close()
+if stride is not None:
+    logging.info("Adaptive stride detected %d of %d frames", stride.detections, stride.frames)
+if metrics_enabled:
+    logging.info("Stage timings\n%s", metrics.format_summary())
+    if metrics_path:
+        metrics.export(metrics_path)
+metrics.close()
 cv2.destroyAllWindows()
\ No newline at end of file
@@ -0,0 +1,303 @@
+"""
+Validates region files saved by Selection_Tool and converts them for training and analysis.
+
+Region files are lists of {"points": [[x, y], ...], "class": name} in full-resolution pixels.
+Supported outputs, all resolved against the class names of a class.yaml/data.yaml/class.txt file:
+
+    seg    YOLO segmentation labels   labels_seg/<stem>.txt   "cls x1 y1 x2 y2 ..." normalized
+    obb    YOLO oriented box labels   labels_obb/<stem>.txt   "cls x1 y1 x2 y2 x3 y3 x4 y4" normalized
+    coco   one COCO instance file     coco.json               category ids are the class ids + 1
+    masks  per-class binary masks     masks/<stem>/<class>.png
+
+    python region_convert.py regions/ --classes data.yaml --formats seg coco --out converted
+    python region_convert.py regions/ --classes data.yaml --validate-only
+
+Folders are searched for *_bounding_boxes*.json files, the names Selection_Tool saves under.
+The image size needed for normalization and masks is read from the image next to the
+region file (<stem>.jpg/.png) or taken from --image-size.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import yaml
+from PIL import Image, ImageDraw
+
+FORMATS = ("seg", "obb", "coco", "masks")
+# Names Selection_Tool saves region files under, e.g. frame_5_bounding_boxes.json
+REGION_FILE = re.compile(r"_bounding_boxes[^/\\]*\.json$", re.IGNORECASE)
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def load_class_names(path):
+    """Class names from a YAML file with a "names" list or dict, or a text file with one name per line."""
+    with open(path, "r") as f:
+        if path.endswith((".yaml", ".yml")):
+            names = yaml.safe_load(f)["names"]
+            return [names[k] for k in sorted(names)] if isinstance(names, dict) else list(names)
+        return [line.strip() for line in f if line.strip()]
+
+
+def region_stem(json_path):
+    """frame_5_bounding_boxes_final.json -> frame_5"""
+    name = os.path.basename(json_path)
+    return re.sub(r"(_bounding_boxes.*)?\.json$", "", name, flags=re.IGNORECASE)
+
+
+def find_image(json_path):
+    base = os.path.join(os.path.dirname(json_path), region_stem(json_path))
+    for ext in IMAGE_EXTENSIONS:
+        for candidate in (base + ext, base + ext.upper()):
+            if os.path.exists(candidate):
+                return candidate
+    return None
+
+
+def validate_regions(data, class_names, image_size=None):
+    """
+    Checks the structure of a region file.
+
+    Args:
+        data (object): parsed JSON
+        class_names (list): known class names
+        image_size (tuple): (width, height), when given points must lie inside the image
+
+    Returns:
+        errors (list): one message per problem, empty when the file is valid
+    """
+    if not isinstance(data, list):
+        return ["top level is not a list of regions"]
+    errors = []
+    for i, region in enumerate(data):
+        if not isinstance(region, dict) or "points" not in region or "class" not in region:
+            errors.append(f"region {i}: expected an object with 'points' and 'class'")
+            continue
+        if region["class"] not in class_names:
+            errors.append(f"region {i}: unknown class {region['class']!r}")
+        try:
+            points = np.asarray(region["points"], dtype=np.float64)
+        except (TypeError, ValueError):
+            errors.append(f"region {i}: points are not numeric")
+            continue
+        if points.ndim != 2 or points.shape[1] != 2 or len(points) < 3:
+            errors.append(f"region {i}: needs at least 3 [x, y] points")
+            continue
+        if not np.isfinite(points).all():
+            errors.append(f"region {i}: non-finite coordinates")
+            continue
+        x, y = points[:, 0], points[:, 1]
+        if abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1))) < 1e-9:
+            errors.append(f"region {i}: polygon has zero area")
+        if image_size is not None:
+            w, h = image_size
+            if (points < 0).any() or (x > w).any() or (y > h).any():
+                errors.append(f"region {i}: points outside the {w}x{h} image")
+    return errors
+
+
+def obb_corners(points):
+    """Four corners of a region, the points themselves for quads, else the minimum-area rectangle."""
+    if len(points) == 4:
+        return points
+    import cv2
+
+    return cv2.boxPoints(cv2.minAreaRect(points.astype(np.float32))).astype(np.float64)
+
+
+def write_text(path, lines):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write("".join(line + "\n" for line in lines))
+
+
+def convert_file(json_path, class_names, formats, out_dir, image_size=None, validate_only=False):
+    """
+    Validates and converts one region file, run in the worker processes.
+
+    Args:
+        json_path (str): region file
+        class_names (list): class names, the index is the class id
+        formats (list): output formats, see FORMATS
+        out_dir (str): output root
+        image_size (tuple): (width, height) used when no image is found next to the file
+        validate_only (bool): only validate, write nothing
+
+    Returns:
+        result (dict): {"file", "errors", "outputs", "image", "annotations"}, the last two
+            are the COCO records for the coordinator to number
+    """
+    result = {"file": json_path, "errors": [], "outputs": [], "image": None, "annotations": []}
+    try:
+        with open(json_path, "r") as f:
+            data = json.load(f)
+        image_path = find_image(json_path)
+        if image_path is not None:
+            with Image.open(image_path) as image:
+                image_size = image.size
+        result["errors"] = validate_regions(data, class_names, image_size)
+        if result["errors"] or validate_only:
+            return result
+        if image_size is None:
+            result["errors"] = ["image size unknown, no image next to the file and no --image-size"]
+            return result
+
+        w, h = image_size
+        stem = region_stem(json_path)
+        polygons = [np.asarray(region["points"], dtype=np.float64) for region in data]
+        class_ids = [class_names.index(region["class"]) for region in data]
+        scale = np.array([w, h], dtype=np.float64)
+
+        if "seg" in formats:
+            path = os.path.join(out_dir, "labels_seg", stem + ".txt")
+            lines = [f"{c} " + " ".join(f"{v:.6f}" for v in (p / scale).ravel()) for p, c in zip(polygons, class_ids)]
+            write_text(path, lines)
+            result["outputs"].append(path)
+        if "obb" in formats:
+            path = os.path.join(out_dir, "labels_obb", stem + ".txt")
+            lines = [f"{c} " + " ".join(f"{v:.6f}" for v in (obb_corners(p) / scale).ravel()) for p, c in zip(polygons, class_ids)]
+            write_text(path, lines)
+            result["outputs"].append(path)
+        if "masks" in formats:
+            mask_dir = os.path.join(out_dir, "masks", stem)
+            os.makedirs(mask_dir, exist_ok=True)
+            masks = {}
+            for p, c in zip(polygons, class_ids):
+                if c not in masks:
+                    masks[c] = Image.new("L", (w, h), 0)
+                ImageDraw.Draw(masks[c]).polygon([tuple(v) for v in p.tolist()], fill=255)
+            for c, mask in masks.items():
+                path = os.path.join(mask_dir, f"{class_names[c]}.png")
+                mask.save(path)
+                result["outputs"].append(path)
+        if "coco" in formats:
+            result["image"] = {"file_name": os.path.basename(image_path) if image_path else stem, "width": w, "height": h}
+            for p, c in zip(polygons, class_ids):
+                x, y = p[:, 0], p[:, 1]
+                area = 0.5 * abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)))
+                result["annotations"].append(
+                    {
+                        "category_id": c + 1,
+                        "segmentation": [p.ravel().tolist()],
+                        "area": float(area),
+                        "bbox": [float(x.min()), float(y.min()), float(x.max() - x.min()), float(y.max() - y.min())],
+                        "iscrowd": 0,
+                    }
+                )
+    except Exception as e:
+        result["errors"].append(f"{type(e).__name__}: {e}")
+    return result
+
+
+class CocoWriter:
+    """Collects COCO records as files finish, annotations are spooled to disk instead of kept in memory."""
+
+    def __init__(self, path, class_names):
+        self.path = path
+        self.class_names = class_names
+        self.images = []
+        self.annotation_count = 0
+        self.spool = tempfile.TemporaryFile("w+")
+
+    def add(self, result):
+        image_id = len(self.images) + 1
+        self.images.append({"id": image_id, **result["image"]})
+        for annotation in result["annotations"]:
+            self.annotation_count += 1
+            self.spool.write(json.dumps({"id": self.annotation_count, "image_id": image_id, **annotation}) + "\n")
+
+    def close(self):
+        # COCO ids start at 1, 0 is reserved for the background
+        categories = [{"id": i + 1, "name": name} for i, name in enumerate(self.class_names)]
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, "w") as f:
+            f.write('{"images": ' + json.dumps(self.images) + ', "categories": ' + json.dumps(categories))
+            f.write(', "annotations": [')
+            self.spool.seek(0)
+            for i, line in enumerate(self.spool):
+                f.write(("," if i else "") + line.rstrip("\n"))
+            f.write("]}\n")
+        self.spool.close()
+
+
+def collect_files(inputs):
+    """Region files given directly, plus the *_bounding_boxes*.json files found in folders, so outputs such as coco.json are skipped."""
+    files = []
+    for path in inputs:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files += [os.path.join(root, n) for n in sorted(names) if REGION_FILE.search(n)]
+        else:
+            files.append(path)
+    return files
+
+
+def run(files, class_names, formats, out_dir, image_size=None, validate_only=False, workers=None):
+    """
+    Converts files on a process pool and yields each result as soon as it is done.
+
+    Args:
+        workers (int): worker processes, 0 converts in this process, None uses every CPU
+    """
+    args = (class_names, formats, out_dir, image_size, validate_only)
+    if workers == 0:
+        for path in files:
+            yield convert_file(path, *args)
+        return
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Keep a bounded number of files in flight so results stream out from the start
+        limit = 4 * workers
+        files = iter(files)
+        pending = set()
+        while True:
+            for path in files:
+                pending.add(executor.submit(convert_file, path, *args))
+                if len(pending) >= limit:
+                    break
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate and convert region files")
+    parser.add_argument("inputs", nargs="+", help="region JSON files or folders of them")
+    parser.add_argument("--classes", default="data.yaml", help="class.yaml, data.yaml or class.txt")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=["seg"])
+    parser.add_argument("--out", default="converted", help="output folder")
+    parser.add_argument("--image-size", help="WxH used when no image is found next to a region file")
+    parser.add_argument("--validate-only", action="store_true")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, 0 runs inline")
+    args = parser.parse_args()
+
+    class_names = load_class_names(args.classes)
+    image_size = tuple(int(v) for v in args.image_size.lower().split("x")) if args.image_size else None
+    files = collect_files(args.inputs)
+    coco = CocoWriter(os.path.join(args.out, "coco.json"), class_names) if "coco" in args.formats and not args.validate_only else None
+
+    failed = 0
+    for result in run(files, class_names, args.formats, args.out, image_size, args.validate_only, args.workers):
+        if result["errors"]:
+            failed += 1
+            print(f"FAIL {result['file']}")
+            for error in result["errors"]:
+                print(f"    {error}")
+        else:
+            print(f"ok   {result['file']}", flush=True)
+            if coco is not None and result["image"] is not None:
+                coco.add(result)
+    if coco is not None:
+        coco.close()
+    print(f"{len(files) - failed}/{len(files)} files ok")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
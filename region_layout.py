@@ -0,0 +1,175 @@
+"""
+Binary region layouts: a compiled RegionSet stored so it can be memory-mapped without any parsing.
+
+File layout (little endian):
+
+    0   magic      b"RLAYOUT\\0"
+    8   uint32     format version
+    12  uint32     header length in bytes
+    16  header     JSON with the class names, grid parameters and {name: dtype, shape, offset} per array
+    ..  arrays     raw array data, every array starts on a 64 byte boundary after the header
+
+Every process that opens the same file shares one copy of it through the page cache.
+
+    python region_layout.py frame_5_bounding_boxes_final.json --classes data.yaml --label-map-size 1920x1080
+"""
+import argparse
+import json
+import os
+import struct
+
+import numpy as np
+import yaml
+
+from region_matching import RegionSet
+
+MAGIC = b"RLAYOUT\0"
+LAYOUT_VERSION = 1
+LAYOUT_EXTENSION = ".rlay"
+ALIGNMENT = 64
+
+
+def is_layout_path(path):
+    return str(path).lower().endswith(LAYOUT_EXTENSION)
+
+
+def _align(n):
+    return -(-n // ALIGNMENT) * ALIGNMENT
+
+
+class RegionLayout:
+    """A compiled region set with its class names and an optional pre-rasterized region label map."""
+
+    def __init__(self, regions, class_names, label_map=None):
+        """
+        Args:
+            regions (RegionSet): compiled regions, class ids index into class_names
+            class_names (list): class names of the layout
+            label_map (ndarray, optional): (H, W) int32 map of region index + 1 per pixel, 0 outside every region
+        """
+        self.regions = regions
+        self.class_names = list(class_names)
+        self.label_map = label_map
+
+    @classmethod
+    def from_json(cls, regions, class_names, label_map_size=None):
+        """
+        Compiles the region list written by Selection_Tool.
+
+        Args:
+            regions (list): [{"points": [[x, y], ...], "class": name}, ...]
+            class_names (list): class names, the index is the class id
+            label_map_size (tuple, optional): (width, height) of the label map, none is built when None
+        """
+        region_set = RegionSet.from_json(regions, {name: i for i, name in enumerate(class_names)})
+        label_map = None
+        if label_map_size is not None:
+            import cv2
+
+            w, h = label_map_size
+            label_map = np.zeros((h, w), dtype=np.int32)
+            # Later regions are drawn over earlier ones where they overlap
+            for i, points_array in enumerate(region_set.polygons):
+                cv2.fillPoly(label_map, [points_array], i + 1)
+        return cls(region_set, class_names, label_map)
+
+    def save(self, path):
+        arrays = {name: np.ascontiguousarray(getattr(self.regions, name)) for name in RegionSet.array_names}
+        if self.label_map is not None:
+            arrays["label_map"] = np.ascontiguousarray(self.label_map, dtype=np.int32)
+
+        entries, offset = {}, 0
+        for name, array in arrays.items():
+            entries[name] = {"dtype": array.dtype.newbyteorder("<").str, "shape": list(array.shape), "offset": offset}
+            offset = _align(offset + array.nbytes)
+        header = json.dumps(
+            {
+                "class_names": self.class_names,
+                "cell_size": int(self.regions.cell_size),
+                "grid_shape": [int(v) for v in self.regions.grid_shape],
+                "arrays": entries,
+            }
+        ).encode()
+        data_start = _align(16 + len(header))
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC + struct.pack("<II", LAYOUT_VERSION, len(header)) + header)
+            for name, array in arrays.items():
+                f.seek(data_start + entries[name]["offset"])
+                f.write(array.astype(entries[name]["dtype"], copy=False).tobytes())
+            f.truncate(data_start + offset)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Memory-maps a layout file, the arrays are read-only views into the mapping.
+
+        Raises:
+            ValueError: the file is not a region layout or has an unsupported version
+        """
+        with open(path, "rb") as f:
+            magic, (version, header_len) = f.read(8), struct.unpack("<II", f.read(8))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a region layout file")
+            if version != LAYOUT_VERSION:
+                raise ValueError(f"{path} has layout version {version}, expected {LAYOUT_VERSION}")
+            header = json.loads(f.read(header_len))
+        data_start = _align(16 + header_len)
+
+        # Plain ndarray views of the mapping, slicing memmap subclasses is much slower
+        mapping = np.memmap(path, dtype=np.uint8, mode="r").view(np.ndarray)
+        arrays = {}
+        for name, entry in header["arrays"].items():
+            dtype = np.dtype(entry["dtype"])
+            start = data_start + entry["offset"]
+            nbytes = int(np.prod(entry["shape"])) * dtype.itemsize
+            arrays[name] = mapping[start:start + nbytes].view(dtype).reshape(entry["shape"])
+
+        regions = RegionSet.from_arrays(arrays, header["cell_size"], header["grid_shape"])
+        return cls(regions, header["class_names"], arrays.get("label_map"))
+
+    def regions_for(self, class_dict):
+        """
+        The region set with class ids translated to another class list, the layout arrays are reused when they already match.
+
+        Args:
+            class_dict (dict): class name to class id mapping of the consumer
+        """
+        remap = np.array([class_dict[name] for name in self.class_names], dtype=np.int64)
+        if np.array_equal(remap, np.arange(len(remap))):
+            return self.regions
+        regions = RegionSet.from_arrays(
+            {name: getattr(self.regions, name) for name in RegionSet.array_names},
+            self.regions.cell_size,
+            self.regions.grid_shape,
+        )
+        regions.class_ids = remap[self.regions.class_ids]
+        return regions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert region JSON files to binary region layouts")
+    parser.add_argument("inputs", nargs="+", help="region JSON files")
+    parser.add_argument("--classes", default="data.yaml", help="YAML file with the class names")
+    parser.add_argument("--label-map-size", help="WxH of the pre-rasterized region label map")
+    parser.add_argument("--out", help="output file, only with a single input, <input>.rlay by default")
+    args = parser.parse_args()
+
+    with open(args.classes, "r") as f:
+        class_names = yaml.safe_load(f)["names"]
+    size = tuple(int(v) for v in args.label_map_size.lower().split("x")) if args.label_map_size else None
+    if args.out and len(args.inputs) > 1:
+        parser.error("--out needs a single input")
+
+    for json_path in args.inputs:
+        with open(json_path, "r") as f:
+            layout = RegionLayout.from_json(json.load(f), class_names, size)
+        out = args.out or os.path.splitext(json_path)[0] + LAYOUT_EXTENSION
+        layout.save(out)
+        print(f"{json_path} -> {out} ({len(layout.regions)} regions)")
+
+
+if __name__ == "__main__":
+    main()
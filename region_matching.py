@@ -0,0 +1,313 @@
+import numpy as np
+
+# Region states reported per region by RegionSet.assign
+EMPTY = 0
+CORRECT = 1
+INCORRECT = 2
+
+
+class RegionSet:
+    """Compiled region polygons that resolve detection centers to regions in one vectorized pass."""
+
+    # Upper bound on the number of (pair, edge) elements evaluated at once
+    chunk_elements = 1 << 21
+    # Upper bound on the number of spatial index cells
+    max_grid_cells = 1 << 20
+    # Arrays that fully describe a compiled set, see from_arrays
+    array_names = (
+        "counts", "offsets", "vertices", "class_ids", "bounds",
+        "edge_start", "edge_end", "grid_origin", "cell_offsets", "cell_regions",
+    )
+
+    def __init__(self, polygons, class_ids, cell_size=None, previous=None):
+        """
+        Compiles the region polygons into contiguous vertex, bounds and edge arrays plus a uniform grid index.
+
+        Args:
+            polygons (list): list of (N, 2) vertex arrays, one per region
+            class_ids (list): expected class id for every region
+            cell_size (int, optional): grid cell size in pixels, derived from the region sizes when None
+            previous (RegionSet, optional): set this one replaces on a reload, the edges of identical
+                regions are copied from it and self.old_index tells which they are
+        """
+        polygons = [np.asarray(p, dtype=np.int32).reshape(-1, 2) for p in polygons]
+        num_regions = len(polygons)
+        self.counts = np.array([len(p) for p in polygons], dtype=np.int64)
+        self.offsets = np.concatenate(([0], np.cumsum(self.counts))).astype(np.int64)
+        self.vertices = np.ascontiguousarray(
+            np.concatenate(polygons) if num_regions else np.zeros((0, 2)), dtype=np.int32
+        )
+        self.class_ids = np.ascontiguousarray(class_ids, dtype=np.int64).reshape(-1)
+        # cv2-ready (N, 1, 2) views into the shared vertex array
+        self.polygons = [self.vertices[s:e].reshape((-1, 1, 2)) for s, e in zip(self.offsets[:-1], self.offsets[1:])]
+
+        if num_regions:
+            starts = self.offsets[:-1]
+            self.bounds = np.concatenate(
+                (np.minimum.reduceat(self.vertices, starts, axis=0), np.maximum.reduceat(self.vertices, starts, axis=0)),
+                axis=1,
+            )
+        else:
+            self.bounds = np.zeros((0, 4), dtype=np.int32)
+
+        # Pad every polygon to the largest vertex count with degenerate edges on its first vertex,
+        # they never cross a scanline and only touch a point that is already on the polygon
+        max_vertices = int(self.counts.max()) if num_regions else 1
+        self.edge_start = np.zeros((num_regions, max_vertices, 2), dtype=np.int64)
+        self.edge_end = np.zeros((num_regions, max_vertices, 2), dtype=np.int64)
+        # (R,) index of the identical region in previous, -1 for new or changed ones
+        self.old_index = None if previous is None else match_regions(previous, self)
+        rebuild = range(num_regions)
+        if self.old_index is not None:
+            kept = np.flatnonzero(self.old_index >= 0)
+            # Rows differ only in their padding when the widest polygon changed, which repeats the first vertex
+            width = min(max_vertices, previous.edge_start.shape[1])
+            self.edge_start[kept, :width] = previous.edge_start[self.old_index[kept], :width]
+            self.edge_end[kept, :width] = previous.edge_end[self.old_index[kept], :width]
+            first = self.vertices[self.offsets[kept]][:, None]
+            self.edge_start[kept, width:] = first
+            self.edge_end[kept, width:] = first
+            rebuild = np.flatnonzero(self.old_index < 0).tolist()
+        for i in rebuild:
+            pts = polygons[i]
+            n = len(pts)
+            self.edge_start[i, :n] = pts
+            self.edge_end[i, :n] = np.roll(pts, -1, axis=0)
+            self.edge_start[i, n:] = pts[0]
+            self.edge_end[i, n:] = pts[0]
+
+        self.build_grid(cell_size)
+
+    @classmethod
+    def from_json(cls, regions, class_dict, cell_size=None, previous=None):
+        """
+        Builds a RegionSet from the region list written by Selection_Tool.
+
+        Args:
+            regions (list): [{"points": [[x, y], ...], "class": name}, ...]
+            class_dict (dict): class name to class id mapping
+            cell_size (int, optional): grid cell size in pixels
+            previous (RegionSet, optional): set this one replaces, see __init__
+        """
+        polygons = [np.array(region["points"], dtype=np.int32) for region in regions]
+        class_ids = [class_dict[region["class"]] for region in regions]
+        return cls(polygons, class_ids, cell_size, previous)
+
+    @classmethod
+    def from_arrays(cls, arrays, cell_size, grid_shape):
+        """
+        Rebuilds a compiled set from its arrays without recompiling anything, e.g. from a memory-mapped layout.
+
+        Args:
+            arrays (dict): one array per name in array_names, they are used as is and never written to
+            cell_size (int): grid cell size the cell arrays were built with
+            grid_shape (tuple): (rows, cols) of the grid
+        """
+        self = cls.__new__(cls)
+        for name in cls.array_names:
+            setattr(self, name, arrays[name])
+        self.old_index = None
+        self.cell_size, self.grid_shape = int(cell_size), tuple(int(v) for v in grid_shape)
+        self.polygons = [self.vertices[s:e].reshape((-1, 1, 2)) for s, e in zip(self.offsets[:-1], self.offsets[1:])]
+        return self
+
+    def __len__(self):
+        return len(self.polygons)
+
+    def build_grid(self, cell_size=None):
+        """
+        Buckets every region into the uniform grid cells its bounds overlap.
+
+        The index is stored CSR style: the regions of cell c are
+        cell_regions[cell_offsets[c]:cell_offsets[c + 1]].
+
+        Args:
+            cell_size (int, optional): grid cell size in pixels, the median region extent when None
+        """
+        if not len(self):
+            self.cell_size, self.grid_origin, self.grid_shape = 1, np.zeros(2, dtype=np.int64), (0, 0)
+            self.cell_offsets = np.zeros(1, dtype=np.int64)
+            self.cell_regions = np.zeros(0, dtype=np.int64)
+            return
+
+        bounds = self.bounds.astype(np.int64)
+        origin = bounds[:, :2].min(axis=0)
+        extent = bounds[:, 2:].max(axis=0) - origin + 1
+        if cell_size is None:
+            cell_size = int(np.median(np.maximum(bounds[:, 2] - bounds[:, 0], bounds[:, 3] - bounds[:, 1])))
+        cell_size = max(int(cell_size), 1)
+        while int(np.prod(-(-extent // cell_size))) > self.max_grid_cells:
+            cell_size *= 2
+        cols, rows = (int(v) for v in -(-extent // cell_size))
+
+        cx1, cy1 = ((bounds[:, :2] - origin) // cell_size).T
+        cx2, cy2 = ((bounds[:, 2:] - origin) // cell_size).T
+        span_x, span_y = cx2 - cx1 + 1, cy2 - cy1 + 1
+
+        # Enumerate every (region, cell) pair covered by the region bounds
+        region_idx = np.repeat(np.arange(len(self)), span_x * span_y)
+        local = _ranges(span_x * span_y)
+        cells = (cy1[region_idx] + local // span_x[region_idx]) * cols + cx1[region_idx] + local % span_x[region_idx]
+
+        order = np.argsort(cells, kind="stable")
+        self.cell_regions = region_idx[order]
+        self.cell_offsets = np.concatenate(([0], np.cumsum(np.bincount(cells, minlength=cols * rows))))
+        self.cell_size, self.grid_origin, self.grid_shape = cell_size, origin, (rows, cols)
+
+    def candidates(self, points):
+        """
+        Pairs of (point, region) whose axis-aligned bounds contain the point, looked up through the grid.
+
+        Args:
+            points (ndarray): (P, 2) integer points
+
+        Returns:
+            point_idx (ndarray), region_idx (ndarray): candidate pairs ordered by point index
+        """
+        rows, cols = self.grid_shape
+        cell_xy = (points - self.grid_origin) // self.cell_size
+        valid = (cell_xy[:, 0] >= 0) & (cell_xy[:, 0] < cols) & (cell_xy[:, 1] >= 0) & (cell_xy[:, 1] < rows)
+        point_idx = np.flatnonzero(valid)
+        cells = cell_xy[point_idx, 1] * cols + cell_xy[point_idx, 0]
+
+        starts, ends = self.cell_offsets[cells], self.cell_offsets[cells + 1]
+        point_idx = np.repeat(point_idx, ends - starts)
+        region_idx = self.cell_regions[np.repeat(starts, ends - starts) + _ranges(ends - starts)]
+
+        px, py = points[point_idx, 0], points[point_idx, 1]
+        b = self.bounds[region_idx]
+        hit = (px >= b[:, 0]) & (px <= b[:, 2]) & (py >= b[:, 1]) & (py <= b[:, 3])
+        return point_idx[hit], region_idx[hit]
+
+    def contains_pairs(self, points, point_idx, region_idx):
+        """
+        Exact point-in-polygon test for the given (point, region) pairs.
+
+        A point on an edge or vertex counts as inside, the same as
+        cv2.pointPolygonTest(..., False) >= 0.
+
+        Returns:
+            inside (ndarray): boolean per pair
+        """
+        inside = np.zeros(len(point_idx), dtype=bool)
+        step = max(1, self.chunk_elements // self.edge_start.shape[1])
+        for s in range(0, len(point_idx), step):
+            pts = points[point_idx[s:s + step]]
+            regs = region_idx[s:s + step]
+            inside[s:s + step] = self._contains_chunk(pts, self.edge_start[regs], self.edge_end[regs])
+        return inside
+
+    @staticmethod
+    def _contains_chunk(points, edge_start, edge_end):
+        px, py = points[:, 0, None], points[:, 1, None]
+        x1, y1 = edge_start[..., 0], edge_start[..., 1]
+        x2, y2 = edge_end[..., 0], edge_end[..., 1]
+
+        # cross > 0 means the point lies left of the edge direction; exact in integers
+        dy = y2 - y1
+        cross = (x2 - x1) * (py - y1) - dy * (px - x1)
+        on_edge = (
+            (cross == 0)
+            & (px >= np.minimum(x1, x2)) & (px <= np.maximum(x1, x2))
+            & (py >= np.minimum(y1, y2)) & (py <= np.maximum(y1, y2))
+        )
+        # Even-odd rule: count edges crossing the horizontal ray to the right of the point
+        crossing = ((y1 > py) != (y2 > py)) & (cross * dy > 0)
+        return on_edge.any(axis=1) | (np.count_nonzero(crossing, axis=1) % 2 == 1)
+
+    def assign(self, centers, box_classes):
+        """
+        Resolves box centers to region states.
+
+        Each region takes the first box (in detection order) whose center lies inside it,
+        and is correct when that box's class matches the region's expected class.
+
+        Args:
+            centers (ndarray): (P, 2) integer box centers
+            box_classes (ndarray): (P,) class id per box
+
+        Returns:
+            states (ndarray): (R,) EMPTY, CORRECT or INCORRECT per region
+            matches (ndarray): (R,) index of the matched box per region, -1 if empty
+        """
+        centers = np.asarray(centers, dtype=np.int64).reshape(-1, 2)
+        box_classes = np.asarray(box_classes).reshape(-1).astype(np.int64)
+        states = np.full(len(self), EMPTY, dtype=np.int8)
+        matches = np.full(len(self), -1, dtype=np.int64)
+        if not len(centers) or not len(self):
+            return states, matches
+
+        point_idx, region_idx = self.candidates(centers)
+        inside = self.contains_pairs(centers, point_idx, region_idx)
+        point_idx, region_idx = point_idx[inside], region_idx[inside]
+
+        first = np.full(len(self), len(centers), dtype=np.int64)
+        np.minimum.at(first, region_idx, point_idx)
+        hit = first < len(centers)
+        matches[hit] = first[hit]
+        correct = box_classes[first[hit]] == self.class_ids[hit]
+        states[hit] = np.where(correct, CORRECT, INCORRECT)
+        return states, matches
+
+
+def match_regions(old, new):
+    """
+    Finds the regions of a new set that are unchanged from an old one.
+
+    Args:
+        old (RegionSet), new (RegionSet): compiled region sets
+
+    Returns:
+        old_index (ndarray): (R_new,) index of the identical region (same vertices and class) in old, -1 otherwise
+    """
+    def keys(regions):
+        return [
+            (int(c), regions.vertices[s:e].tobytes())
+            for c, s, e in zip(regions.class_ids.tolist(), regions.offsets[:-1].tolist(), regions.offsets[1:].tolist())
+        ]
+
+    available = {}
+    for i, key in enumerate(keys(old)):
+        available.setdefault(key, []).append(i)
+    old_index = np.full(len(new), -1, dtype=np.int64)
+    for i, key in enumerate(keys(new)):
+        candidates = available.get(key)
+        if candidates:
+            old_index[i] = candidates.pop(0)
+    return old_index
+
+
+def _ranges(lengths):
+    """Concatenation of arange(n) for every n in lengths."""
+    lengths = np.asarray(lengths, dtype=np.int64)
+    total = int(lengths.sum())
+    if not total:
+        return np.zeros(0, dtype=np.int64)
+    starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return np.arange(total, dtype=np.int64) - starts
+
+
+def box_centers(boxes):
+    """
+    Integer centers of xyxy boxes, truncated the same way as int((x1 + x2) / 2).
+
+    Args:
+        boxes (ndarray): (P, 4) xyxy boxes
+
+    Returns:
+        centers (ndarray): (P, 2) int64 centers
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    centers = np.stack(((boxes[:, 0] + boxes[:, 2]) / 2, (boxes[:, 1] + boxes[:, 3]) / 2), axis=1)
+    return np.trunc(centers).astype(np.int64)
+
+
+def count_states(states):
+    """
+    Counts regions per state.
+
+    Returns:
+        correct (int), incorrect (int), empty (int)
+    """
+    counts = np.bincount(np.asarray(states, dtype=np.int64), minlength=3)
+    return int(counts[CORRECT]), int(counts[INCORRECT]), int(counts[EMPTY])
@@ -0,0 +1,114 @@
+import cv2
+import numpy as np
+
+from region_matching import EMPTY, CORRECT, INCORRECT
+
+
+class RegionRenderer:
+    """Draws region outlines from a cached outline layer and detections in a single pass per frame."""
+
+    def __init__(self, regions, empty_color, correct_color, incorrect_color, thickness=2, previous=None, old_index=None):
+        """
+        Initializes the renderer for a compiled region set.
+
+        Args:
+            regions (RegionSet): compiled regions to outline
+            empty_color (tuple): color of regions without a detection
+            correct_color (tuple): color of regions holding the expected class
+            incorrect_color (tuple): color of regions holding another class
+            thickness (int): outline thickness
+            previous (RegionRenderer, optional): renderer of the set regions were reloaded from,
+                the outline pixels of its unchanged regions are reused by the first outline_layer
+            old_index (ndarray, optional): (R,) index of the identical region in previous, -1 for new or changed ones
+        """
+        self.regions = regions
+        self.thickness = thickness
+        self.palette = np.zeros((3, 3), dtype=np.uint8)
+        self.palette[EMPTY] = empty_color
+        self.palette[CORRECT] = correct_color
+        self.palette[INCORRECT] = incorrect_color
+        self._layer_key = None
+        self._ys = self._xs = self._owner = None
+        self._outlines = None  # (shape, [(ys, xs) of every region outline]), read by reloads on another thread
+        self._previous = previous
+        self._old_index = old_index
+
+    def _outline(self, polygon, shape):
+        """Pixels of one region outline, drawn on a patch around the region instead of the whole frame."""
+        pad = self.thickness + 1
+        pts = polygon.reshape(-1, 2)
+        x1, y1 = np.maximum(pts.min(axis=0) - pad, 0)
+        x2, y2 = np.minimum(pts.max(axis=0) + pad + 1, (shape[1], shape[0]))
+        if x1 >= x2 or y1 >= y2:
+            return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+        patch = np.zeros((y2 - y1, x2 - x1), dtype=np.uint8)
+        cv2.polylines(patch, [polygon - np.array([x1, y1], dtype=polygon.dtype)], isClosed=True, color=1, thickness=self.thickness)
+        ys, xs = np.nonzero(patch)
+        return ys + y1, xs + x1
+
+    def outline_layer(self, shape):
+        """
+        Pixels covered by the region outlines for a frame shape, built once and cached.
+
+        Every outline pixel remembers the last region drawn over it, which is what
+        drawing the outlines one by one with cv2.polylines would leave visible.
+
+        Args:
+            shape (tuple): frame shape
+
+        Returns:
+            ys (ndarray), xs (ndarray), owner (ndarray): outline pixel coordinates and owning region index
+        """
+        key = (shape[:2], id(self.regions))
+        if self._layer_key != key:
+            previous, old_index = self._previous, self._old_index
+            cached = previous._outlines if previous is not None and previous.thickness == self.thickness else None
+            reuse = cached is not None and cached[0] == shape[:2]
+            self._previous = self._old_index = None
+            outlines = []
+            for i, points_array in enumerate(self.regions.polygons):
+                if reuse and old_index[i] >= 0:
+                    outlines.append(cached[1][old_index[i]])
+                else:
+                    outlines.append(self._outline(points_array, shape))
+            labels = np.zeros(shape[:2], dtype=np.int32)
+            for i, (ys, xs) in enumerate(outlines):
+                labels[ys, xs] = i + 1
+            ys, xs = np.nonzero(labels)
+            self._ys, self._xs, self._owner = ys, xs, labels[ys, xs] - 1
+            self._outlines = shape[:2], outlines
+            self._layer_key = key
+        return self._ys, self._xs, self._owner
+
+    def draw_regions(self, im0, states):
+        """
+        Composites every region outline in the color of its state with one masked write.
+
+        Args:
+            im0 (ndarray): frame to draw on
+            states (ndarray): per-region EMPTY/CORRECT/INCORRECT state
+        """
+        ys, xs, owner = self.outline_layer(im0.shape)
+        im0[ys, xs] = self.palette[np.asarray(states, dtype=np.intp)[owner]]
+
+    @staticmethod
+    def draw_detections(im0, boxes, clss, confs, class_info, class_color):
+        """
+        Draws every detection box and its label exactly once.
+
+        Args:
+            im0 (ndarray): frame to draw on
+            boxes (ndarray): (N, 4) xyxy bounding boxes
+            clss (ndarray): class id per box
+            confs (ndarray): confidence per box
+            class_info (list): class names
+            class_color (list): color per class id
+        """
+        # One conversion for all boxes; int() truncation toward zero as before
+        boxes = np.asarray(boxes).reshape(-1, 4).astype(np.int32).tolist()
+        clss = np.asarray(clss).reshape(-1).astype(np.int64).tolist()
+        confs = np.asarray(confs).reshape(-1).tolist()
+        for (x1, y1, x2, y2), cls, conf in zip(boxes, clss, confs):
+            label = f"{class_info[cls]}: {conf:.2f}"
+            cv2.rectangle(im0, (x1, y1), (x2, y2), class_color[cls], 2)
+            cv2.putText(im0, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, class_color[cls], 2)
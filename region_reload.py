@@ -0,0 +1,65 @@
+import logging
+import os
+import threading
+
+LOGGER = logging.getLogger("parts_regions")
+
+
+class RegionWatcher:
+    """Polls a region file and compiles every new version on a background thread, ready to be swapped in."""
+
+    def __init__(self, path, compile_fn, interval=1.0):
+        """
+        Starts watching a file.
+
+        Args:
+            path (str): region JSON or binary layout to watch
+            compile_fn (callable): path -> compiled update, called on the watcher thread
+            interval (float): seconds between modification checks
+        """
+        self.path = path
+        self.compile_fn = compile_fn
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.pending = None
+        self.reloads = 0
+        self.stopped = threading.Event()
+        self.signature = self._signature()
+        self.thread = threading.Thread(target=self._run, name="region-watch", daemon=True)
+        self.thread.start()
+
+    def _signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            signature = self._signature()
+            if signature is None or signature == self.signature:
+                continue
+            self.signature = signature
+            try:
+                update = self.compile_fn(self.path)
+            except Exception as e:
+                # Half-written or invalid files keep the current regions until the next change
+                LOGGER.warning("Region reload of %s failed, keeping the current regions: %s", self.path, e)
+                continue
+            with self.lock:
+                self.pending = update
+
+    def take(self):
+        """Returns the newest compiled update once, or None when nothing changed since the last call."""
+        if self.pending is None:
+            return None
+        with self.lock:
+            update, self.pending = self.pending, None
+        if update is not None:
+            self.reloads += 1
+        return update
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
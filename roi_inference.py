@@ -0,0 +1,194 @@
+import math
+
+import cv2
+import numpy as np
+
+from tracking import StreamTracker
+
+
+def roi_windows(bounds, frame_shape, margin=32, merge_gap=64):
+    """
+    Windows covering every region, regions about merge_gap pixels apart or closer share a window.
+
+    Args:
+        bounds (ndarray): (R, 4) xmin, ymin, xmax, ymax region bounds
+        frame_shape (tuple): frame shape
+        margin (int): pixels added around every region so objects crossing its edge are seen whole
+        merge_gap (int): merge distance, also the cell size of the grid the regions are clustered on
+
+    Returns:
+        windows (ndarray): (T, 4) x1, y1, x2, y2 windows inside the frame, x2 and y2 exclusive
+    """
+    h, w = frame_shape[:2]
+    boxes = np.asarray(bounds, dtype=np.int64).reshape(-1, 4).copy()
+    if not len(boxes):
+        return np.zeros((0, 4), dtype=np.int64)
+    boxes[:, :2] -= margin
+    boxes[:, 2:] += margin + 1
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, w)
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, h)
+    boxes = boxes[(boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])]
+    if not len(boxes):
+        # Every region lies outside the frame, e.g. a stream smaller than the labeled frame
+        return np.zeros((0, 4), dtype=np.int64)
+
+    # Cluster on a coarse occupancy grid: regions in touching cells end up in one component
+    cell = max(int(merge_gap), 1)
+    cells = np.zeros((-(-h // cell), -(-w // cell)), dtype=np.uint8)
+    first = boxes[:, :2] // cell
+    last = (boxes[:, 2:] - 1) // cell
+    for (cx1, cy1), (cx2, cy2) in zip(first.tolist(), last.tolist()):
+        cells[cy1:cy2 + 1, cx1:cx2 + 1] = 1
+    _, labels = cv2.connectedComponents(cells, connectivity=8)
+    groups = labels[first[:, 1], first[:, 0]]
+
+    _, groups = np.unique(groups, return_inverse=True)
+    windows = np.zeros((groups.max() + 1, 4), dtype=np.int64)
+    windows[:, :2] = np.iinfo(np.int64).max
+    np.minimum.at(windows[:, 0], groups, boxes[:, 0])
+    np.minimum.at(windows[:, 1], groups, boxes[:, 1])
+    np.maximum.at(windows[:, 2], groups, boxes[:, 2])
+    np.maximum.at(windows[:, 3], groups, boxes[:, 3])
+    return windows
+
+
+def nms(dets, iou_threshold=0.5):
+    """
+    Greedy class-aware non-maximum suppression.
+
+    Args:
+        dets (ndarray): (N, 6) [x1, y1, x2, y2, conf, cls] rows
+        iou_threshold (float): boxes of one class overlapping a kept box by more than this are dropped
+
+    Returns:
+        keep (ndarray): kept row indices, highest confidence first
+    """
+    # Shift every class to its own coordinate range so boxes of different classes never overlap
+    offset = dets[:, 5:6] * (dets[:, :4].max() + 1)
+    boxes = dets[:, :4] + offset
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    order = np.argsort(-dets[:, 4], kind="stable")
+    keep = []
+    while len(order):
+        i, rest = order[0], order[1:]
+        keep.append(i)
+        iw = (np.minimum(boxes[i, 2], boxes[rest, 2]) - np.maximum(boxes[i, 0], boxes[rest, 0])).clip(0)
+        ih = (np.minimum(boxes[i, 3], boxes[rest, 3]) - np.maximum(boxes[i, 1], boxes[rest, 1])).clip(0)
+        inter = iw * ih
+        order = rest[inter / (areas[i] + areas[rest] - inter + 1e-9) <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+class RoiDetector:
+    """Runs the detector only on windows around the regions, all windows in one batch at the full-frame scale."""
+
+    def __init__(self, management, frame_shape, imgsz=640, margin=32, merge_gap=64, max_area_ratio=0.7, iou=0.5, **predict_kwargs):
+        """
+        Derives the crop windows from the region layout of a Managing_Parts.
+
+        Every window is grown to the size of the largest one, so the crops share one batch and are
+        resized by the same factor full-frame inference at imgsz would use. When the windows would
+        cover more than max_area_ratio of the frame the whole frame is used instead. Without any
+        region inside the frame there is no window and nothing is detected.
+
+        Args:
+            management (Managing_Parts): model and regions, windows follow reloaded regions
+            frame_shape (tuple): shape of the stream frames
+            imgsz (int): inference size of the full frame the crops are scaled like
+            margin (int): pixels added around every region
+            merge_gap (int): distance below which regions share a window
+            max_area_ratio (float): window area share of the frame above which the full frame is used
+            iou (float): IoU threshold of the NMS merging detections of overlapping windows
+            **predict_kwargs: forwarded to model.predict, e.g. conf
+        """
+        self.management = management
+        self.frame_shape = frame_shape
+        self.imgsz = imgsz
+        self.margin = margin
+        self.merge_gap = merge_gap
+        self.max_area_ratio = max_area_ratio
+        self.iou = iou
+        self.predict_kwargs = predict_kwargs
+        self.regions = None
+        self.update_windows()
+
+    def update_windows(self):
+        h, w = self.frame_shape[:2]
+        self.regions = self.management.regions
+        scale = self.imgsz / max(h, w)
+        windows = roi_windows(self.regions.bounds, self.frame_shape, self.margin, self.merge_gap)
+        tile_w = int((windows[:, 2] - windows[:, 0]).max()) if len(windows) else w
+        tile_h = int((windows[:, 3] - windows[:, 1]).max()) if len(windows) else h
+        if len(windows) * tile_w * tile_h > self.max_area_ratio * w * h:
+            windows, tile_w, tile_h = np.array([[0, 0, w, h]], dtype=np.int64), w, h
+        elif len(windows):
+            # Grow every window around its center to the common tile size, shifted back inside the frame
+            cx, cy = (windows[:, 0] + windows[:, 2]) // 2, (windows[:, 1] + windows[:, 3]) // 2
+            x1 = (cx - tile_w // 2).clip(0, w - tile_w)
+            y1 = (cy - tile_h // 2).clip(0, h - tile_h)
+            windows = np.stack((x1, y1, x1 + tile_w, y1 + tile_h), axis=1)
+        self.windows = windows
+        stride = 32
+        self.infer_size = [math.ceil(tile_h * scale / stride) * stride, math.ceil(tile_w * scale / stride) * stride]
+        full = math.ceil(h * scale / stride) * stride * math.ceil(w * scale / stride) * stride
+        # Model input pixels per frame relative to full-frame inference
+        self.pixel_ratio = len(windows) * self.infer_size[0] * self.infer_size[1] / full
+
+    def detect(self, frame):
+        """
+        Detects objects in the region windows of a frame.
+
+        Args:
+            frame (ndarray): full frame
+
+        Returns:
+            dets (ndarray): (N, 6) [x1, y1, x2, y2, conf, cls] rows in frame coordinates
+        """
+        if self.management.regions is not self.regions:
+            self.update_windows()
+        if not len(self.windows):
+            return np.zeros((0, 6), dtype=np.float32)
+        crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in self.windows.tolist()]
+        results = self.management.model.predict(crops, imgsz=self.infer_size, verbose=False, **self.predict_kwargs)
+        dets = []
+        for (x1, y1, _, _), result in zip(self.windows.tolist(), results):
+            data = result.boxes.data.cpu().numpy().astype(np.float32)
+            data[:, [0, 2]] += x1
+            data[:, [1, 3]] += y1
+            dets.append(data)
+        dets = np.concatenate(dets) if dets else np.zeros((0, 6), dtype=np.float32)
+        if len(self.windows) > 1 and len(dets):
+            dets = dets[nms(dets, self.iou)]
+        return dets
+
+    def warmup(self):
+        """Runs one batch of blank crops at the window size."""
+        frame = np.zeros(self.frame_shape, dtype=np.uint8)
+        self.detect(frame)
+
+
+class RoiTracker:
+    """Drop-in for YOLO.track on one stream: ROI detection followed by a standalone tracker."""
+
+    def __init__(self, detector, tracker="bytetrack.yaml"):
+        """
+        Args:
+            detector (RoiDetector): window detector of the stream
+            tracker (str): tracker yaml
+        """
+        self.detector = detector
+        self.tracker = StreamTracker(tracker)
+
+    def track(self, frame, **kwargs):
+        """
+        Detects and tracks one frame, keyword arguments of YOLO.track are accepted and ignored.
+
+        Returns:
+            results (list): one Ultralytics Results with tracked boxes, like YOLO.track
+        """
+        from ultralytics.engine.results import Results
+
+        tracks = self.tracker.update(self.detector.detect(frame), frame)
+        # Rows with a track id column, or no id column when nothing is tracked, as YOLO.track returns them
+        boxes = tracks[:, :7] if len(tracks) else np.zeros((0, 6), dtype=np.float32)
+        return [Results(frame, path="", names=self.detector.management.model.names, boxes=boxes)]
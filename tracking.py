@@ -0,0 +1,42 @@
+import numpy as np
+import yaml
+
+
+class StreamTracker:
+    """Standalone Ultralytics tracker for one stream, fed from plain (batched) predict results."""
+
+    def __init__(self, tracker="bytetrack.yaml"):
+        """
+        Builds the tracker from an Ultralytics tracker config.
+
+        Args:
+            tracker (str): tracker yaml, e.g. bytetrack.yaml or botsort.yaml
+        """
+        from ultralytics.trackers.track import TRACKER_MAP
+        from ultralytics.utils import IterableSimpleNamespace
+        from ultralytics.utils.checks import check_yaml
+
+        with open(check_yaml(tracker), "r") as f:
+            cfg = IterableSimpleNamespace(**yaml.safe_load(f))
+        self.tracker = TRACKER_MAP[cfg.tracker_type](args=cfg)
+
+    def update(self, boxes, frame):
+        """
+        Associates one frame's detections with the running tracks.
+
+        Args:
+            boxes (Boxes | ndarray): Ultralytics Boxes of the frame, or (N, 6) [x1, y1, x2, y2, conf, cls] rows
+            frame (ndarray): the frame the detections come from
+
+        Returns:
+            tracks (ndarray): (M, 8) [x1, y1, x2, y2, track_id, conf, cls, det_idx] rows of active tracks
+        """
+        from ultralytics.engine.results import Boxes
+
+        if not isinstance(boxes, Boxes):
+            boxes = Boxes(np.asarray(boxes, dtype=np.float32).reshape(-1, 6), frame.shape[:2])
+        tracks = self.tracker.update(boxes.cpu().numpy(), frame)
+        return np.asarray(tracks, dtype=np.float32).reshape(-1, 8)
+
+    def reset(self):
+        self.tracker.reset()
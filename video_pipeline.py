@@ -0,0 +1,199 @@
+import queue
+import threading
+
+import cv2
+import numpy as np
+
+from metrics import NULL_METRICS
+
+# End-of-stream marker passed down the stage queues
+_STOP = None
+
+
+class PipelinedRunner:
+    """Runs decode, inference, post-processing and encode as pipelined stages over one Managing_Parts."""
+
+    def __init__(
+        self,
+        management,
+        cap,
+        video_writer=None,
+        infer_draw=False,
+        queue_size=4,
+        show=True,
+        event_log=None,
+        metrics=None,
+        detector=None,
+        clip_recorder=None,
+        stride=None,
+    ):
+        """
+        Initializes the pipeline.
+
+        Decode, inference and encode each run on their own thread. Post-processing and display
+        run on the calling thread, since the OpenCV GUI must be driven from the main thread.
+        Stages are connected by bounded queues, and decoded frames live in a fixed pool of
+        preallocated buffers, so a slow stage throttles the ones before it.
+
+        Args:
+            management (Managing_Parts): model and region manager
+            cap (cv2.VideoCapture): opened video source
+            video_writer (cv2.VideoWriter, optional): sink for annotated frames
+            infer_draw (bool): draw detections on the frames
+            queue_size (int): capacity of every stage queue
+            show (bool): display frames through management.display_frames
+            event_log (OccupancyLogWriter, optional): sink for per-frame occupancy records
+            metrics (StageMetrics, optional): stage timings and queue depths, management.metrics when None
+            detector (object, optional): anything with a YOLO-like track(frame), e.g. RoiTracker, management.model when None
+            clip_recorder (ClipRecorder, optional): records clips around region state changes
+            stride (AdaptiveStride, optional): skips detection on still frames, which reuse the last tracked boxes,
+                the states of every detected frame are handed back to it after post-processing
+        """
+        self.management = management
+        self.cap = cap
+        self.video_writer = video_writer
+        self.infer_draw = infer_draw
+        self.show = show
+        self.event_log = event_log
+        self.detector = detector
+        self.clip_recorder = clip_recorder
+        self.stride = stride
+        self.metrics = metrics if metrics is not None else getattr(management, "metrics", NULL_METRICS)
+        self.decoded = queue.Queue(maxsize=queue_size)
+        self.inferred = queue.Queue(maxsize=queue_size)
+        self.processed = queue.Queue(maxsize=queue_size)
+        self.stop_event = threading.Event()
+        self.errors = []
+
+        # Every frame in flight holds one buffer, so the pool covers all queues plus one frame per stage
+        w, h = (int(cap.get(x)) for x in (cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT))
+        self.free_buffers = queue.Queue()
+        for _ in range(3 * queue_size + 4):
+            self.free_buffers.put(np.empty((h, w, 3), dtype=np.uint8))
+
+    def _put(self, q, item):
+        """Blocking put that gives up once the pipeline is stopping."""
+        while not self.stop_event.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        """Blocking get that returns _STOP once the pipeline is stopping."""
+        while not self.stop_event.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _STOP
+
+    def _stage(self, target, *args):
+        def run():
+            try:
+                target(*args)
+            except Exception as e:
+                self.errors.append(e)
+                self.stop_event.set()
+
+        thread = threading.Thread(target=run, name=target.__name__, daemon=True)
+        thread.start()
+        return thread
+
+    def decode(self):
+        index = 0
+        while not self.stop_event.is_set():
+            buffer = self._get(self.free_buffers)
+            if buffer is _STOP:
+                break
+            with self.metrics.stage("cap.read"):
+                success, frame = self.cap.read(buffer)
+            if not success:
+                break
+            if not self._put(self.decoded, (index, frame)):
+                break
+            index += 1
+        self._put(self.decoded, _STOP)
+
+    def infer(self):
+        while True:
+            item = self._get(self.decoded)
+            if item is _STOP:
+                break
+            index, frame = item
+            detected = self.stride is None or self.stride.check(frame)
+            if detected:
+                with self.metrics.stage("model.track"):
+                    detector = self.detector if self.detector is not None else self.management.model
+                    results = detector.track(frame, persist=True, show=False)
+            if self.stride is not None and self.metrics.enabled:
+                self.metrics.gauge("stride", self.stride.stride)
+            if not self._put(self.inferred, (index, frame, results, detected)):
+                break
+        self._put(self.inferred, _STOP)
+
+    def encode(self):
+        while True:
+            item = self._get(self.processed)
+            if item is _STOP:
+                break
+            index, frame = item
+            if self.video_writer is not None:
+                with self.metrics.stage("video_writer.write"):
+                    self.video_writer.write(frame)
+            self.free_buffers.put(frame)
+
+    def postprocess(self, index, frame, results, detected=True):
+        """Region matching and annotation for one frame, the same as the sequential loop."""
+        with self.metrics.stage("process_data"):
+            self.management.process_data(frame, results, infer_draw=self.infer_draw, observed=detected)
+        if self.stride is not None and detected:
+            self.stride.observe(self.management.region_states)
+        if self.event_log is not None:
+            self.event_log.log(index, self.management)
+        if self.show:
+            with self.metrics.stage("display_frames"):
+                self.management.display_frames(frame)
+        if self.clip_recorder is not None:
+            with self.metrics.stage("clip_recorder.record"):
+                self.clip_recorder.record(frame, self.management, index)
+
+    def run(self):
+        """
+        Processes the whole stream in frame order and blocks until every frame is encoded.
+
+        Returns:
+            frames (int): number of processed frames
+        """
+        threads = [self._stage(self.decode), self._stage(self.infer), self._stage(self.encode)]
+        expected = 0
+        try:
+            while True:
+                item = self._get(self.inferred)
+                if item is _STOP:
+                    break
+                index, frame, results, detected = item
+                assert index == expected, f"frame {index} arrived out of order, expected {expected}"
+                self.postprocess(index, frame, results, detected)
+                if not self._put(self.processed, (index, frame)):
+                    break
+                expected += 1
+                if self.metrics.enabled:
+                    self.metrics.gauge("queue.decoded", self.decoded.qsize())
+                    self.metrics.gauge("queue.inferred", self.inferred.qsize())
+                    self.metrics.gauge("queue.processed", self.processed.qsize())
+                    self.metrics.gauge("buffers.free", self.free_buffers.qsize())
+                self.metrics.frame()
+                self.metrics.maybe_log()
+        except BaseException:
+            self.stop_event.set()
+            raise
+        finally:
+            self._put(self.processed, _STOP)
+            for thread in threads:
+                thread.join()
+        if self.errors:
+            raise self.errors[0]
+        return expected
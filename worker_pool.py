@@ -0,0 +1,250 @@
+import math
+import multiprocessing as mp
+import os
+import queue
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from metrics import NULL_METRICS
+from tracking import StreamTracker
+
+
+def _worker(worker_id, model_path, shm_name, slots, frame_shape, tasks, results, threads, predict_kwargs, spawned):
+    """Worker process: detects on the frames the coordinator placed in the shared ring."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    if spawned:
+        # A spawned worker has its own resource tracker, which would unlink the coordinator's segment on exit
+        resource_tracker.unregister(shm._name, "shared_memory")
+    frames = np.ndarray((slots, *frame_shape), dtype=np.uint8, buffer=shm.buf)
+    try:
+        import torch
+        from ultralytics import YOLO
+
+        torch.set_num_threads(threads)
+        model = YOLO(model_path, task="detect")
+        model.predict(np.zeros(frame_shape, dtype=np.uint8), verbose=False, **predict_kwargs)
+        results.put(("ready", worker_id, model.names))
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            index, slot = task
+            result = model.predict(frames[slot], verbose=False, **predict_kwargs)[0]
+            results.put(("result", index, slot, result.boxes.data.cpu().numpy().astype(np.float32)))
+    except Exception as e:
+        results.put(("error", worker_id, f"{type(e).__name__}: {e}"))
+    finally:
+        del frames
+        shm.close()
+
+
+class InferencePool:
+    """Detection on N worker processes, each with its own model, fed through a shared-memory frame ring."""
+
+    def __init__(self, model_path, frame_shape, workers=None, slots=None, threads_per_worker=1, ordered=True, **predict_kwargs):
+        """
+        Starts the workers and waits until every one has loaded and warmed up its model.
+
+        Frames are written straight into ring slots and only (index, slot) pairs and the
+        detection arrays cross the process boundary. Workers are forked on POSIX, so the pool
+        should be created before this process loads a model or starts threads.
+
+        Args:
+            model_path (str): model every worker loads, .pt weights or an inference_backends export
+            frame_shape (tuple): (height, width, 3) of the stream frames
+            workers (int): worker processes, one per CPU when None
+            slots (int): ring slots, frames in flight at once, 2 * workers + 2 when None
+            threads_per_worker (int): torch threads inside every worker
+            ordered (bool): hand results out in frame order, needed for tracking
+            **predict_kwargs: forwarded to model.predict in the workers, e.g. conf or imgsz
+        """
+        method = "fork" if "fork" in mp.get_all_start_methods() else "spawn"
+        context = mp.get_context(method)
+        self.workers = workers or os.cpu_count() or 1
+        self.slots = slots or 2 * self.workers + 2
+        self.frame_shape = tuple(frame_shape)
+        self.ordered = ordered
+        self.shm = shared_memory.SharedMemory(create=True, size=self.slots * math.prod(self.frame_shape))
+        self.frames = np.ndarray((self.slots, *self.frame_shape), dtype=np.uint8, buffer=self.shm.buf)
+        self.free = list(range(self.slots))
+        self.tasks = context.Queue()
+        self.results = context.Queue()
+        self.done = {}  # index -> (slot, dets) received ahead of their turn
+        self.next_index = 0
+        self.in_flight = 0
+        self.names = None
+        self.processes = [
+            context.Process(
+                target=_worker,
+                args=(i, model_path, self.shm.name, self.slots, self.frame_shape, self.tasks, self.results, threads_per_worker, predict_kwargs, method != "fork"),
+                name=f"infer-worker-{i}",
+                daemon=True,
+            )
+            for i in range(self.workers)
+        ]
+        for process in self.processes:
+            process.start()
+        for _ in range(self.workers):
+            _, _, self.names = self._receive("ready")
+
+    def _receive(self, kind):
+        while True:
+            try:
+                message = self.results.get(timeout=1.0)
+            except queue.Empty:
+                if not all(process.is_alive() for process in self.processes):
+                    raise RuntimeError("An inference worker died")
+                continue
+            if message[0] == "error":
+                raise RuntimeError(f"Inference worker {message[1]} failed: {message[2]}")
+            assert message[0] == kind, f"unexpected worker message {message[0]}"
+            return message
+
+    def acquire(self):
+        """A free ring slot, or None when every slot holds a frame in flight."""
+        return self.free.pop() if self.free else None
+
+    def frame(self, slot):
+        """Writable view of a ring slot."""
+        return self.frames[slot]
+
+    def submit(self, index, slot):
+        """Queues the frame in slot for detection, index is its position in the stream."""
+        self.tasks.put((index, slot))
+        self.in_flight += 1
+
+    def next_result(self):
+        """
+        Waits for the next detection result, in frame order when the pool is ordered.
+
+        Returns:
+            index (int), slot (int), dets (ndarray): frame index, its slot and (N, 6) [x1, y1, x2, y2, conf, cls] rows
+        """
+        if self.ordered:
+            while self.next_index not in self.done:
+                _, index, slot, dets = self._receive("result")
+                self.done[index] = (slot, dets)
+            index = self.next_index
+            slot, dets = self.done.pop(index)
+            self.next_index += 1
+        else:
+            _, index, slot, dets = self._receive("result")
+        self.in_flight -= 1
+        return index, slot, dets
+
+    def release(self, slot):
+        """Returns a slot to the ring once its frame is fully processed."""
+        self.free.append(slot)
+
+    def close(self):
+        for _ in self.processes:
+            self.tasks.put(None)
+        for process in self.processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        del self.frames
+        self.shm.close()
+        self.shm.unlink()
+
+
+class PoolRunner:
+    """Reads frames into an InferencePool and tracks, matches and writes the results on the coordinator."""
+
+    def __init__(
+        self, management, cap, pool, video_writer=None, infer_draw=False, show=True, event_log=None, tracker="bytetrack.yaml", metrics=None, clip_recorder=None
+    ):
+        """
+        Initializes the runner.
+
+        With an ordered pool the tracker sees every frame in stream order, exactly as
+        model.track would. An unordered pool skips tracking and matches regions on raw
+        detections as soon as they arrive, which needs no video writer since frames finish
+        out of order.
+
+        Args:
+            management (Managing_Parts): region manager, its model is not used
+            cap (cv2.VideoCapture): opened video source
+            pool (InferencePool): started worker pool
+            video_writer (cv2.VideoWriter, optional): sink for annotated frames
+            infer_draw (bool): draw detections on the frames
+            show (bool): display frames through management.display_frames
+            event_log (OccupancyLogWriter, optional): sink for per-frame occupancy records
+            tracker (str): tracker yaml used on the coordinator
+            metrics (StageMetrics, optional): stage timings, management.metrics when None
+            clip_recorder (ClipRecorder, optional): records clips around region state changes, ordered pools only
+        """
+        assert pool.ordered or (video_writer is None and clip_recorder is None), "an unordered pool cannot write video"
+        self.management = management
+        self.cap = cap
+        self.pool = pool
+        self.video_writer = video_writer
+        self.infer_draw = infer_draw
+        self.show = show
+        self.event_log = event_log
+        self.clip_recorder = clip_recorder
+        self.tracker = StreamTracker(tracker) if pool.ordered else None
+        self.metrics = metrics if metrics is not None else getattr(management, "metrics", NULL_METRICS)
+
+    def read(self, index):
+        """Decodes the next frame into a free slot and submits it, False at the end of the stream."""
+        slot = self.pool.acquire()
+        buffer = self.pool.frame(slot)
+        with self.metrics.stage("cap.read"):
+            success, frame = self.cap.read(buffer)
+        if not success:
+            self.pool.release(slot)
+            return False
+        if frame is not buffer:
+            buffer[...] = frame
+        self.pool.submit(index, slot)
+        return True
+
+    def postprocess(self, index, frame, dets):
+        if self.tracker is not None:
+            with self.metrics.stage("track"):
+                tracks = self.tracker.update(dets, frame)
+            # Frames without tracks are processed too, so departures clear the regions
+            with self.metrics.stage("process_data"):
+                self.management.process_data(frame, tracks[:, :4], tracks[:, 6], tracks[:, 5], self.infer_draw, tracks[:, 4])
+        else:
+            with self.metrics.stage("process_data"):
+                self.management.process_data(frame, dets[:, :4], dets[:, 5], dets[:, 4], self.infer_draw)
+        if self.event_log is not None:
+            self.event_log.log(index, self.management)
+        if self.show:
+            with self.metrics.stage("display_frames"):
+                self.management.display_frames(frame)
+        if self.clip_recorder is not None:
+            with self.metrics.stage("clip_recorder.record"):
+                self.clip_recorder.record(frame, self.management, index)
+        if self.video_writer is not None:
+            with self.metrics.stage("video_writer.write"):
+                self.video_writer.write(frame)
+
+    def run(self):
+        """
+        Processes the whole stream, keeping every ring slot busy.
+
+        Returns:
+            frames (int): number of processed frames
+        """
+        submitted = processed = 0
+        ended = False
+        while True:
+            while not ended and self.pool.free:
+                ended = not self.read(submitted)
+                submitted += not ended
+            if processed == submitted:
+                break
+            with self.metrics.stage("wait_result"):
+                index, slot, dets = self.pool.next_result()
+            self.postprocess(index, self.pool.frame(slot), dets)
+            self.pool.release(slot)
+            processed += 1
+            if self.metrics.enabled:
+                self.metrics.gauge("pool.in_flight", self.pool.in_flight)
+            self.metrics.frame()
+            self.metrics.maybe_log()
+        return processed